@@ -90,12 +90,14 @@ def transliterate(text: str, from_script: Script, to_script: Script) -> str:
         >>> transliterate("namaste", Script.IAST, Script.TELUGU)
         'నమస్తే'
     """
+    # Identity conversions (and empty input) never need to cross into Rust
+    if from_script is to_script or not text:
+        return text
+
     if RUST_AVAILABLE:
         return _rust_transliterate(text, from_script.value, to_script.value)
 
     # Fallback to placeholder if Rust not available
-    if from_script == to_script:
-        return text
     return f"[Transliterate '{text}' from {from_script.value} to {to_script.value}]"
 
 
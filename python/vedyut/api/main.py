@@ -1,11 +1,24 @@
 """FastAPI application for Vedyut Sanskrit NLP API"""
 
+import asyncio
+import functools
+import hashlib
+import os
 import time
 
+from cachetools import TTLCache
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 
+from .. import Script
+from .. import analyze as _core_analyze
+from .. import generate_verb as _core_generate_verb
+from .. import sanskritify as _core_sanskritify
+from .. import segment as _core_segment
+from .. import transliterate as _core_transliterate
+
 app = FastAPI(
     title="Vedyut Sanskrit NLP API",
     description="High-performance Sanskrit NLP toolkit with Rust core",
@@ -102,6 +115,89 @@ class GenerateResponse(BaseModel):
     took_ms: float
 
 
+class HealthResponse(BaseModel):
+    """Response model for health check"""
+
+    status: str
+    service: str
+
+
+class MetricsResponse(BaseModel):
+    """Response model for API metrics"""
+
+    requests_total: int
+    avg_latency_ms: float
+    uptime_seconds: float
+    cache_hits: int
+    cache_misses: int
+    cache_size: int
+
+
+# ===== Helpers =====
+
+# Responses are serialized straight to JSON bytes by pydantic-core when an
+# endpoint declares a response model, so every JSON endpoint should declare one
+HEALTH_RESPONSE = HealthResponse(status="ok", service="vedyut")
+
+# Endpoints are pure functions of their request, so identical requests share a response
+RESPONSE_CACHE: TTLCache = TTLCache(
+    maxsize=int(os.getenv("VEDYUT_RESPONSE_CACHE_SIZE", "100000")),
+    ttl=float(os.getenv("VEDYUT_RESPONSE_CACHE_TTL", "3600")),
+)
+CACHE_STATS = {"hits": 0, "misses": 0}
+
+# Short names and alternate spellings accepted in addition to Script values
+# (the same set the core's Scheme::from_str accepts)
+SCRIPT_ALIASES = {
+    "hk": Script.HARVARD_KYOTO,
+    "iso": Script.ISO15919,
+    "deva": Script.DEVANAGARI,
+    "bangla": Script.BENGALI,
+    "punjabi": Script.GURMUKHI,
+    "oriya": Script.ODIA,
+    "sinhalese": Script.SINHALA,
+}
+
+
+def _parse_script(name: str) -> Script:
+    """Resolve a scheme name from a request, rejecting unknown ones with 400"""
+    name = name.lower()
+    if name in SCRIPT_ALIASES:
+        return SCRIPT_ALIASES[name]
+    try:
+        return Script(name)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Unsupported scheme: {name}") from None
+
+
+def _cache_key(endpoint: str, req: BaseModel) -> bytes:
+    """Response cache key for a request to an endpoint"""
+    return hashlib.sha1(f"{endpoint}\0{req.model_dump_json()}".encode()).digest()
+
+
+def _cached_response(key: bytes, start_time: float) -> BaseModel | None:
+    """Return the cached response for key (with fresh timing), or None on a miss"""
+    cached = RESPONSE_CACHE.get(key)
+    if cached is None:
+        CACHE_STATS["misses"] += 1
+        return None
+
+    CACHE_STATS["hits"] += 1
+    return cached.model_copy(update={"took_ms": (time.time() - start_time) * 1000})
+
+
+def _to_analysis_result(word: str, analysis: dict) -> AnalysisResult:
+    """Map a core analysis dict (Sanskrit feature names) to the API model"""
+    return AnalysisResult(
+        lemma=analysis.get("root") or analysis.get("stem") or word,
+        case=analysis.get("vibhakti") or analysis.get("case"),
+        number=analysis.get("vacana") or analysis.get("number"),
+        gender=analysis.get("linga") or analysis.get("gender"),
+        person=analysis.get("purusha") or analysis.get("person"),
+        tense=analysis.get("lakara") or analysis.get("tense"),
+    )
+
+
 # ===== API Endpoints =====
 
 
@@ -116,10 +212,10 @@ async def root():
     }
 
 
-@app.get("/health")
+@app.get("/health", response_model=HealthResponse)
 async def health():
     """Health check endpoint"""
-    return {"status": "ok", "service": "vedyut"}
+    return HEALTH_RESPONSE
 
 
 @app.post("/v1/transliterate", response_model=TransliterateResponse)
@@ -130,19 +226,27 @@ async def transliterate(req: TransliterateRequest):
     Supported schemes: devanagari, iast, slp1, hk (harvard-kyoto), itrans
     """
     start_time = time.time()
+    from_script = _parse_script(req.from_scheme)
+    to_script = _parse_script(req.to_scheme)
+
+    cache_key = _cache_key("transliterate", req)
+    if (cached := _cached_response(cache_key, start_time)) is not None:
+        return cached
 
     try:
-        # TODO: Call Rust core for actual transliteration
-        result = f"[TODO: Transliterate '{req.text}' from {req.from_scheme} to {req.to_scheme}]"
+        # Core calls are CPU-bound; keep them off the event loop
+        result = await asyncio.to_thread(_core_transliterate, req.text, from_script, to_script)
 
         took_ms = (time.time() - start_time) * 1000
 
-        return TransliterateResponse(
+        response = TransliterateResponse(
             result=result,
             from_scheme=req.from_scheme,
             to_scheme=req.to_scheme,
             took_ms=took_ms,
         )
+        RESPONSE_CACHE[cache_key] = response
+        return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -155,20 +259,23 @@ async def segment(req: SegmentRequest):
     Returns multiple possible segmentations ranked by likelihood
     """
     start_time = time.time()
+    script = _parse_script(req.scheme)
+
+    cache_key = _cache_key("segment", req)
+    if (cached := _cached_response(cache_key, start_time)) is not None:
+        return cached
 
     try:
-        # TODO: Call Rust core for actual segmentation
-        # Placeholder: return mock segmentation
-        segments = [
-            req.text.split(),  # Simple space split as placeholder
-        ]
+        segments = await asyncio.to_thread(_core_segment, req.text, script, req.max_splits)
 
         took_ms = (time.time() - start_time) * 1000
 
-        return SegmentResponse(
+        response = SegmentResponse(
             segments=segments,
             took_ms=took_ms,
         )
+        RESPONSE_CACHE[cache_key] = response
+        return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -181,25 +288,25 @@ async def analyze(req: AnalyzeRequest):
     Returns possible analyses with grammatical features
     """
     start_time = time.time()
+    script = _parse_script(req.scheme)
+
+    cache_key = _cache_key("analyze", req)
+    if (cached := _cached_response(cache_key, start_time)) is not None:
+        return cached
 
     try:
-        # TODO: Call Rust core for actual analysis
-        # Placeholder: return mock analysis
-        analyses = [
-            AnalysisResult(
-                lemma=req.word,
-                case="nominative",
-                number="singular",
-            )
-        ]
+        raw_analyses = await asyncio.to_thread(_core_analyze, req.word, script)
+        analyses = [_to_analysis_result(req.word, analysis) for analysis in raw_analyses]
 
         took_ms = (time.time() - start_time) * 1000
 
-        return AnalyzeResponse(
+        response = AnalyzeResponse(
             word=req.word,
             analyses=analyses,
             took_ms=took_ms,
         )
+        RESPONSE_CACHE[cache_key] = response
+        return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -213,18 +320,24 @@ async def generate(req: GenerateRequest):
     """
     start_time = time.time()
 
+    cache_key = _cache_key("generate", req)
+    if (cached := _cached_response(cache_key, start_time)) is not None:
+        return cached
+
     try:
-        # TODO: Call Rust core for actual generation
-        # Placeholder: return mock form
-        forms = [f"{req.dhatu}+{req.lakara}+{req.purusha}+{req.vacana}"]
+        forms = await asyncio.to_thread(
+            _core_generate_verb, req.dhatu, req.lakara, req.purusha, req.vacana
+        )
 
         took_ms = (time.time() - start_time) * 1000
 
-        return GenerateResponse(
+        response = GenerateResponse(
             forms=forms,
             dhatu=req.dhatu,
             took_ms=took_ms,
         )
+        RESPONSE_CACHE[cache_key] = response
+        return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -260,33 +373,110 @@ async def sanskritify_text(req: SanskritifyRequest):
     Kannada, Bengali, Gujarati, Gurmukhi, etc.
     """
     start_time = time.time()
+    script = _parse_script(req.script)
+
+    cache_key = _cache_key("sanskritify", req)
+    if (cached := _cached_response(cache_key, start_time)) is not None:
+        return cached
 
     try:
-        # TODO: Call Rust core for actual sanskritification
-        # Placeholder transformation
-        refined = f"[Sanskritified: {req.text}]"
+        refined = await asyncio.to_thread(
+            _core_sanskritify,
+            req.text,
+            script,
+            level=req.level,
+            preserve_meaning=req.preserve_meaning,
+        )
 
         took_ms = (time.time() - start_time) * 1000
 
-        return SanskritifyResponse(
+        response = SanskritifyResponse(
             original=req.text,
             refined=refined,
             script=req.script,
             level=req.level,
             took_ms=took_ms,
         )
+        RESPONSE_CACHE[cache_key] = response
+        return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.get("/metrics")
+_SANSKRITIFY_SYSTEM_PROMPT_V1 = """You are a Sanskrit language expert. Rewrite the user's text (in any Indian language) in a refined, Sanskrit-like register:
+- Replace colloquial and Urdu/Arabic/Persian words with Sanskrit (tatsama) equivalents
+- Prefer formal, classical vocabulary and grammar patterns
+- Write in the requested script
+- Return only the rewritten text
+"""
+
+
+@functools.lru_cache(maxsize=1)
+def _get_llm_client():
+    """Shared LLM client (LLM support is an optional extra)"""
+    try:
+        from ..llm import LLMClient
+    except ImportError:
+        raise HTTPException(
+            status_code=503, detail="LLM support not installed (pip install vedyut[llm])"
+        ) from None
+    # The server owns the process, so it may pool LiteLLM's HTTP connections
+    return LLMClient(pool_connections=True)
+
+
+def _sse_event(data: str, event: str | None = None) -> str:
+    """Format a server-sent event (multi-line data needs one data: field per line)"""
+    # Per-token fast path: most streamed tokens are a single line
+    if event is None and "\n" not in data:
+        return f"data: {data}\n\n"
+    lines = [f"event: {event}"] if event else []
+    lines.extend(f"data: {line}" for line in data.split("\n"))
+    return "\n".join(lines) + "\n\n"
+
+
+@app.post("/v1/sanskritify/stream")
+async def sanskritify_stream(req: SanskritifyRequest):
+    """
+    Sanskritify text with an LLM, streaming tokens as server-sent events
+
+    The first bytes arrive after the first generated token instead of after the
+    full response. The stream ends with a `[DONE]` event.
+    """
+    script = _parse_script(req.script)
+    llm = _get_llm_client()
+
+    messages = [
+        {"role": "system", "content": _SANSKRITIFY_SYSTEM_PROMPT_V1},
+        {
+            "role": "user",
+            "content": f"Script: {script.value}\nRefinement level: {req.level}\n"
+            f"Preserve meaning: {req.preserve_meaning}\n\nText: {req.text}",
+        },
+    ]
+
+    async def events():
+        try:
+            async for token in llm.astream(messages, temperature=0.3):
+                yield _sse_event(token)
+        except Exception as e:
+            yield _sse_event(str(e), event="error")
+            return
+        yield _sse_event("[DONE]")
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/metrics", response_model=MetricsResponse)
 async def metrics():
     """Basic API metrics (placeholder)"""
-    return {
-        "requests_total": 0,
-        "avg_latency_ms": 0,
-        "uptime_seconds": 0,
-    }
+    return MetricsResponse(
+        requests_total=0,
+        avg_latency_ms=0,
+        uptime_seconds=0,
+        cache_hits=CACHE_STATS["hits"],
+        cache_misses=CACHE_STATS["misses"],
+        cache_size=len(RESPONSE_CACHE),
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,246 @@
+"""Caches for LLM calls (embeddings and answers are expensive to recompute)"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+from collections.abc import Hashable
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from .quantize import dequantize_int8, quantize_int8
+
+
+class EmbeddingCache:
+    """Content-addressed on-disk cache of embedding vectors
+
+    Vectors are stored as raw float32 bytes (or int8 with a float16 scale) in a
+    local SQLite database, keyed by ``sha256(embedding_model + "\\0" + text)``.
+    Only cache misses need to be sent to the embedding provider. The database
+    is safe to share between processes, so a vector fetched by one worker is a
+    hit for all the others.
+
+    Configuration via environment variables:
+    - VEDYUT_EMBED_CACHE: Cache directory (default: ~/.cache/vedyut/embeds)
+    - VEDYUT_EMBED_CACHE_DTYPE: Storage precision, "float32" or "int8" (default: float32)
+    """
+
+    DEFAULT_DIR = "~/.cache/vedyut/embeds"
+    DTYPES = ("float32", "int8")
+
+    # SQLite caps the number of bound parameters per statement
+    _MAX_PARAMS = 500
+    # Wait this long for another process's write lock before raising
+    _BUSY_TIMEOUT_S = 30.0
+    _MMAP_SIZE = 256 * 1024 * 1024
+
+    def __init__(self, cache_dir: str | None = None, dtype: str | None = None):
+        """Open (or create) the cache
+
+        Args:
+            cache_dir: Cache directory (or use VEDYUT_EMBED_CACHE env var)
+            dtype: Storage precision (or use VEDYUT_EMBED_CACHE_DTYPE env var);
+                int8 is 4x smaller but lossy
+        """
+        self.dtype = dtype or os.getenv("VEDYUT_EMBED_CACHE_DTYPE", "float32")
+        if self.dtype not in self.DTYPES:
+            raise ValueError(
+                f"Unsupported cache dtype: {self.dtype} (expected one of {self.DTYPES})"
+            )
+
+        self.cache_dir = Path(
+            os.path.expanduser(cache_dir or os.getenv("VEDYUT_EMBED_CACHE", self.DEFAULT_DIR))
+        )
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # One database per precision so the two encodings never mix
+        db_name = (
+            "embeddings.sqlite3" if self.dtype == "float32" else f"embeddings.{self.dtype}.sqlite3"
+        )
+        self._conn = sqlite3.connect(
+            self.cache_dir / db_name, timeout=self._BUSY_TIMEOUT_S, check_same_thread=False
+        )
+        # The database is shared by every process on the host (e.g. API workers):
+        # WAL lets readers proceed while another process writes, and memory-mapped
+        # reads are served from the OS page cache shared by all of them
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(f"PRAGMA mmap_size={self._MMAP_SIZE}")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def key(model: str, text: str) -> bytes:
+        """Cache key for a (model, text) pair"""
+        return hashlib.sha256((model + "\0" + text).encode("utf-8")).digest()
+
+    def get_many(self, keys: list[bytes]) -> list[np.ndarray | None]:
+        """Fetch vectors in bulk
+
+        Args:
+            keys: Cache keys (see `key`)
+
+        Returns:
+            Read-only float32 vectors in the same order as `keys` (None for misses)
+        """
+        found: dict[bytes, bytes] = {}
+        with self._lock:
+            for i in range(0, len(keys), self._MAX_PARAMS):
+                batch = keys[i : i + self._MAX_PARAMS]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                )
+                found.update(rows)
+
+        return [self._decode(found[k]) if k in found else None for k in keys]
+
+    def set_many(self, keys: list[bytes], vectors: list[np.ndarray]):
+        """Store vectors in bulk
+
+        Args:
+            keys: Cache keys (see `key`)
+            vectors: Embedding vectors, one per key
+        """
+        rows = [(k, self._encode(v)) for k, v in zip(keys, vectors)]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows
+            )
+            self._conn.commit()
+
+    def _encode(self, vector: np.ndarray) -> bytes:
+        if self.dtype == "int8":
+            q, scale = quantize_int8(vector)
+            return scale.tobytes() + q.tobytes()
+        return np.asarray(vector, dtype=np.float32).tobytes()
+
+    def _decode(self, blob: bytes) -> np.ndarray:
+        if self.dtype == "int8":
+            scale = np.frombuffer(blob, dtype=np.float16, count=1)
+            q = np.frombuffer(blob, dtype=np.int8, offset=scale.nbytes)
+            vector = dequantize_int8(q[None, :], scale)[0]
+            vector.setflags(write=False)
+            return vector
+        return np.frombuffer(blob, dtype=np.float32)
+
+    def close(self):
+        """Close the underlying database connection"""
+        with self._lock:
+            self._conn.close()
+
+
+class SemanticCache:
+    """Cache of results keyed by query embedding, matching near-duplicate queries
+
+    A stored entry is a hit when its cosine similarity to the new query is at
+    least `threshold`, so "what is sandhi?" and "what is sandhi in sanskrit"
+    can share a result. Lookups scan every cached vector (one matvec over at
+    most `max_entries` rows), so no near-duplicate above the threshold is
+    missed. Each entry holds several payloads (e.g. retrieved chunks and a full
+    LLM answer) under separate keys.
+
+    Configuration via environment variables:
+    - VEDYUT_SEMCACHE_THRESHOLD: Minimum cosine similarity for a hit (default: 0.95)
+    """
+
+    DEFAULT_THRESHOLD = 0.95
+
+    def __init__(self, threshold: float | None = None, max_entries: int = 10_000):
+        """Create an empty cache
+
+        Args:
+            threshold: Minimum cosine similarity for a hit (or use env var)
+            max_entries: Oldest entries are overwritten beyond this size
+        """
+        self.threshold = (
+            threshold
+            if threshold is not None
+            else float(os.getenv("VEDYUT_SEMCACHE_THRESHOLD", self.DEFAULT_THRESHOLD))
+        )
+        self.max_entries = max_entries
+
+        # Ring buffer of unit query vectors (grown by doubling up to max_entries) and
+        # the payloads stored in the same slots
+        self._vectors: np.ndarray | None = None
+        self._payloads: list[dict] = []
+        self._next = 0  # slot written by the next new entry
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._payloads)
+
+    def get(self, vector: np.ndarray, key: Hashable) -> Any | None:
+        """Look up the payload stored under key for a near-duplicate query
+
+        Args:
+            vector: Query embedding
+            key: Payload key (e.g. ("query", top_k, topic, language))
+
+        Returns:
+            Cached payload, or None on a miss
+        """
+        vector = self._normalize(vector)
+        with self._lock:
+            slot = self._find(vector, key)
+            return self._payloads[slot][key] if slot is not None else None
+
+    def put(self, vector: np.ndarray, key: Hashable, value: Any):
+        """Store a payload for a query
+
+        Args:
+            vector: Query embedding
+            key: Payload key
+            value: Payload to cache
+        """
+        vector = self._normalize(vector)
+        with self._lock:
+            slot = self._find(vector)
+            if slot is not None:
+                self._payloads[slot][key] = value
+                return
+
+            if self._vectors is None or self._vectors.shape[1] != len(vector):
+                self._vectors = np.empty((min(64, self.max_entries), len(vector)), np.float32)
+                self._payloads.clear()
+                self._next = 0
+            elif self._next == len(self._vectors) < self.max_entries:
+                grown = np.empty((min(2 * self._next, self.max_entries), len(vector)), np.float32)
+                grown[: self._next] = self._vectors
+                self._vectors = grown
+
+            slot = self._next
+            self._vectors[slot] = vector
+            if slot < len(self._payloads):
+                self._payloads[slot] = {key: value}
+            else:
+                self._payloads.append({key: value})
+            self._next = (slot + 1) % self.max_entries
+
+    def clear(self):
+        """Drop all entries (e.g. after the underlying index changes)"""
+        with self._lock:
+            self._payloads.clear()
+            self._next = 0
+
+    def _find(self, vector: np.ndarray, key: Hashable | None = None) -> int | None:
+        """Slot of the most similar entry above the threshold (holding `key`, if given)"""
+        if not self._payloads or self._vectors.shape[1] != len(vector):
+            return None
+
+        scores = self._vectors[: len(self._payloads)] @ vector
+        hits = np.flatnonzero(scores >= self.threshold)
+        for slot in hits[np.argsort(-scores[hits], kind="stable")].tolist():
+            if key is None or key in self._payloads[slot]:
+                return slot
+        return None
+
+    @staticmethod
+    def _normalize(vector: np.ndarray) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
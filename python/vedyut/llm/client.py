@@ -1,14 +1,45 @@
 """Unified LLM client with swappable backends via LiteLLM"""
 
+import asyncio
+import functools
+import json
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Any
 
+import httpx
 import litellm
-from litellm import completion, embedding
+import numpy as np
+from litellm import acompletion, aembedding, completion, embedding
+
+from .cache import EmbeddingCache
 
 # Suppress LiteLLM verbose logging
 litellm.suppress_debug_info = True
 
+try:
+    import h2  # noqa: F401
+
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+_HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32)
+
+
+def _install_http_sessions():
+    """Give LiteLLM pooled keep-alive HTTP sessions (unless it already has its own)
+
+    LiteLLM's sessions are process-wide, so this affects every LiteLLM caller in
+    the process; it only runs for clients created with ``pool_connections=True``.
+    """
+    if litellm.client_session is None:
+        litellm.client_session = httpx.Client(http2=HTTP2_AVAILABLE, limits=_HTTP_LIMITS)
+    if litellm.aclient_session is None:
+        litellm.aclient_session = httpx.AsyncClient(http2=HTTP2_AVAILABLE, limits=_HTTP_LIMITS)
+
 
 class LLMClient:
     """Unified LLM client supporting 100+ providers via LiteLLM
@@ -21,11 +52,16 @@ class LLMClient:
 
     Configuration via environment variables:
     - VEDYUT_LLM_MODEL: Model name (default: gpt-4o)
+    - VEDYUT_EMBED_CACHE: Embedding cache directory (default: ~/.cache/vedyut/embeds)
+    - VEDYUT_EMBED_BATCH: Texts per embedding request (default: 128)
+    - VEDYUT_EMBED_PARALLEL: Max embedding requests in flight (default: 8)
     - OPENAI_API_KEY, ANTHROPIC_API_KEY, GOOGLE_API_KEY, etc.
     """
 
     DEFAULT_MODEL = "gpt-4o"
     DEFAULT_EMBEDDING_MODEL = "text-embedding-3-large"
+    DEFAULT_EMBED_BATCH = 128
+    DEFAULT_EMBED_PARALLEL = 8
 
     def __init__(
         self,
@@ -34,6 +70,8 @@ class LLMClient:
         temperature: float = 0.7,
         max_tokens: int | None = None,
         api_key: str | None = None,
+        cache_embeddings: bool = True,
+        pool_connections: bool = False,
     ):
         """Initialize LLM client
 
@@ -43,6 +81,10 @@ class LLMClient:
             temperature: Sampling temperature (0.0-1.0)
             max_tokens: Max tokens in response
             api_key: Optional API key (or use env vars)
+            cache_embeddings: Cache embeddings on disk so repeated texts are never re-sent
+            pool_connections: Install shared keep-alive HTTP sessions (HTTP/2 when h2 is
+                installed) as LiteLLM's process-wide sessions, if none are configured;
+                meant for applications that own the process, such as the API server
         """
         self.model = model or os.getenv("VEDYUT_LLM_MODEL", self.DEFAULT_MODEL)
         self.embedding_model = embedding_model or os.getenv(
@@ -50,10 +92,50 @@ class LLMClient:
         )
         self.temperature = temperature
         self.max_tokens = max_tokens
+        self.embed_batch_size = int(os.getenv("VEDYUT_EMBED_BATCH", self.DEFAULT_EMBED_BATCH))
+        self.embed_max_parallel = int(
+            os.getenv("VEDYUT_EMBED_PARALLEL", self.DEFAULT_EMBED_PARALLEL)
+        )
 
         # LiteLLM auto-detects API keys from env (OPENAI_API_KEY, etc.)
         if api_key:
             litellm.api_key = api_key
+        if pool_connections:
+            _install_http_sessions()
+
+        # The on-disk cache is opened on first embed, so completion-only clients
+        # never touch the filesystem (see _embedding_cache)
+        self._cache_embeddings = cache_embeddings
+        self._cache: EmbeddingCache | None = None
+        self._cache_lock = threading.Lock()
+        # In-process cache for hot loops that embed the same query repeatedly
+        self._embed_single_cached = functools.lru_cache(maxsize=4096)(self._embed_one)
+
+    def _with_prompt_cache(self, messages: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """Mark system prompts as cacheable for providers that need explicit opt-in
+
+        OpenAI caches long prompt prefixes automatically; Anthropic only caches
+        blocks tagged with cache_control. Callers keep stable system prompts first
+        so the cached prefix is reused across calls.
+        """
+        if "claude" not in self.model and not self.model.startswith("anthropic/"):
+            return messages
+
+        return [
+            {
+                **message,
+                "content": [
+                    {
+                        "type": "text",
+                        "text": message["content"],
+                        "cache_control": {"type": "ephemeral"},
+                    }
+                ],
+            }
+            if message["role"] == "system" and isinstance(message["content"], str)
+            else message
+            for message in messages
+        ]
 
     def complete(self, messages: list[dict[str, str]], **kwargs) -> str:
         """Complete a chat conversation
@@ -67,7 +149,26 @@ class LLMClient:
         """
         response = completion(
             model=self.model,
-            messages=messages,
+            messages=self._with_prompt_cache(messages),
+            temperature=kwargs.get("temperature", self.temperature),
+            max_tokens=kwargs.get("max_tokens", self.max_tokens),
+            **{k: v for k, v in kwargs.items() if k not in ["temperature", "max_tokens"]},
+        )
+        return response.choices[0].message.content
+
+    async def acomplete(self, messages: list[dict[str, str]], **kwargs) -> str:
+        """Async variant of `complete` (does not block the event loop)
+
+        Args:
+            messages: List of {"role": "user/assistant/system", "content": "..."}
+            **kwargs: Additional args passed to LiteLLM (temperature, max_tokens, etc.)
+
+        Returns:
+            Response text
+        """
+        response = await acompletion(
+            model=self.model,
+            messages=self._with_prompt_cache(messages),
             temperature=kwargs.get("temperature", self.temperature),
             max_tokens=kwargs.get("max_tokens", self.max_tokens),
             **{k: v for k, v in kwargs.items() if k not in ["temperature", "max_tokens"]},
@@ -86,7 +187,7 @@ class LLMClient:
         """
         response = completion(
             model=self.model,
-            messages=messages,
+            messages=self._with_prompt_cache(messages),
             response_format={"type": "json_object"},
             temperature=kwargs.get("temperature", self.temperature),
             max_tokens=kwargs.get("max_tokens", self.max_tokens),
@@ -97,35 +198,335 @@ class LLMClient:
             },
         )
 
-        import json
-
         content = response.choices[0].message.content
         return json.loads(content)
 
-    def embed(self, texts: list[str]) -> list[list[float]]:
+    def complete_batch(
+        self,
+        batched_messages: list[list[dict[str, str]]],
+        provider: str = "inline",
+        poll_interval: float = 30.0,
+        **kwargs,
+    ) -> list[str | None]:
+        """Complete several independent conversations with fewer round-trips
+
+        Modes:
+        - "inline": pack all tasks into one JSON-mode chat and split the returned
+          array (one round-trip instead of N; best for many small tasks)
+        - "openai_batch": submit a JSONL file to the OpenAI Batch API (about half
+          the price, but may take up to 24h; this call blocks while polling)
+
+        Args:
+            batched_messages: One message list per task
+            provider: "inline" or "openai_batch"
+            poll_interval: Seconds between status checks in "openai_batch" mode
+            **kwargs: Additional args (temperature, max_tokens, etc.)
+
+        Returns:
+            Response texts, one per task, in input order ("openai_batch": None for
+            tasks the Batch API reports as failed)
+        """
+        if not batched_messages:
+            return []
+        if provider == "inline":
+            return self._complete_batch_inline(batched_messages, **kwargs)
+        if provider == "openai_batch":
+            return self._complete_batch_openai(batched_messages, poll_interval, **kwargs)
+        raise ValueError(f"Unsupported batch provider: {provider}")
+
+    def _complete_batch_inline(
+        self, batched_messages: list[list[dict[str, str]]], **kwargs
+    ) -> list[str]:
+        n = len(batched_messages)
+        tasks = "\n\n".join(
+            f"### Task {i + 1}\n"
+            + "\n".join(f"[{message['role']}] {message['content']}" for message in messages)
+            for i, messages in enumerate(batched_messages)
+        )
+        result = self.complete_with_json(
+            [
+                {
+                    "role": "system",
+                    "content": "You will receive several independent tasks. Answer each one "
+                    "separately, as if it were its own conversation. Return JSON: "
+                    '{"responses": ["answer to task 1", "answer to task 2", ...]} '
+                    "with exactly one string per task, in order.",
+                },
+                {"role": "user", "content": f"{n} tasks:\n\n{tasks}"},
+            ],
+            **kwargs,
+        )
+
+        responses = result.get("responses") if isinstance(result, dict) else None
+        if not isinstance(responses, list) or len(responses) != n:
+            raise ValueError(f"Expected {n} responses from batched completion, got: {result!r}")
+        return [str(response) for response in responses]
+
+    def _complete_batch_openai(
+        self, batched_messages: list[list[dict[str, str]]], poll_interval: float, **kwargs
+    ) -> list[str | None]:
+        body = {
+            "model": self.model.removeprefix("openai/"),
+            "temperature": kwargs.pop("temperature", self.temperature),
+            **kwargs,
+        }
+        max_tokens = body.pop("max_tokens", self.max_tokens)
+        if max_tokens is not None:
+            body["max_tokens"] = max_tokens
+
+        requests = "\n".join(
+            json.dumps(
+                {
+                    "custom_id": str(i),
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": {**body, "messages": messages},
+                },
+                ensure_ascii=False,
+            )
+            for i, messages in enumerate(batched_messages)
+        )
+
+        input_file = litellm.create_file(
+            file=("vedyut_batch.jsonl", requests.encode("utf-8")),
+            purpose="batch",
+            custom_llm_provider="openai",
+        )
+        batch = litellm.create_batch(
+            completion_window="24h",
+            endpoint="/v1/chat/completions",
+            input_file_id=input_file.id,
+            custom_llm_provider="openai",
+        )
+        while batch.status not in ("completed", "failed", "expired", "cancelled"):
+            time.sleep(poll_interval)
+            batch = litellm.retrieve_batch(batch_id=batch.id, custom_llm_provider="openai")
+
+        if batch.status != "completed":
+            raise RuntimeError(f"OpenAI batch {batch.id} ended with status {batch.status}")
+
+        # Successful requests land in the output file, failed ones (with "response":
+        # null and an "error" object, or a non-200 response) usually in the error file
+        responses: list[str | None] = [None] * len(batched_messages)
+        reported = set()
+        for file_id in (batch.output_file_id, getattr(batch, "error_file_id", None)):
+            if not file_id:
+                continue
+            output = litellm.file_content(file_id=file_id, custom_llm_provider="openai")
+            for line in output.text.splitlines():
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                i = int(record["custom_id"])
+                reported.add(i)
+                response = record.get("response")
+                if record.get("error") or not response or response.get("status_code") != 200:
+                    continue
+                responses[i] = response["body"]["choices"][0]["message"]["content"]
+
+        missing = [i for i in range(len(batched_messages)) if i not in reported]
+        if missing:
+            raise RuntimeError(f"OpenAI batch {batch.id} returned no result for tasks {missing}")
+        return responses
+
+    def embed(
+        self,
+        texts: list[str],
+        batch_size: int | None = None,
+        max_parallel: int | None = None,
+    ) -> list[np.ndarray]:
         """Generate embeddings for texts
 
+        Duplicate texts are embedded once. Cached vectors are fetched in bulk first;
+        only misses are sent to the provider, split into batches that are
+        dispatched concurrently.
+
         Args:
             texts: List of text strings to embed
+            batch_size: Texts per request (default: VEDYUT_EMBED_BATCH)
+            max_parallel: Max requests in flight (default: VEDYUT_EMBED_PARALLEL)
 
         Returns:
-            List of embedding vectors
+            List of float32 embedding vectors (read-only)
         """
         if isinstance(texts, str):
             texts = [texts]
+        if not texts:
+            return []
 
-        response = embedding(model=self.embedding_model, input=texts)
-        return [item["embedding"] for item in response.data]
+        unique, inverse = self._dedupe(texts)
+        keys, vectors = self._lookup_embeddings(unique)
+        missing_idx = [i for i, vec in enumerate(vectors) if vec is None]
+        if missing_idx:
+            fetched = self._fetch_embeddings(
+                [unique[i] for i in missing_idx],
+                batch_size or self.embed_batch_size,
+                max_parallel or self.embed_max_parallel,
+            )
+            self._store_embeddings(keys, vectors, missing_idx, fetched)
+
+        return vectors if inverse is None else [vectors[j] for j in inverse]
 
-    def embed_single(self, text: str) -> list[float]:
+    def embed_array(self, texts: list[str], normalize: bool = False) -> np.ndarray:
+        """Generate embeddings as a single matrix (avoids per-float Python objects)
+
+        Args:
+            texts: List of text strings to embed
+            normalize: L2-normalize each row (cosine similarity becomes a dot product)
+
+        Returns:
+            float32 array of shape (len(texts), dim)
+        """
+        if isinstance(texts, str):
+            texts = [texts]
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        arr = np.stack(self.embed(texts))
+        if normalize:
+            norms = np.linalg.norm(arr, axis=1, keepdims=True)
+            arr /= np.maximum(norms, 1e-12)
+        return arr
+
+    async def aembed(
+        self,
+        texts: list[str],
+        batch_size: int | None = None,
+        max_parallel: int | None = None,
+    ) -> list[np.ndarray]:
+        """Async variant of `embed` (does not block the event loop)
+
+        Args:
+            texts: List of text strings to embed
+            batch_size: Texts per request (default: VEDYUT_EMBED_BATCH)
+            max_parallel: Max requests in flight (default: VEDYUT_EMBED_PARALLEL)
+
+        Returns:
+            List of float32 embedding vectors (read-only)
+        """
+        if isinstance(texts, str):
+            texts = [texts]
+        if not texts:
+            return []
+
+        unique, inverse = self._dedupe(texts)
+        keys, vectors = self._lookup_embeddings(unique)
+        missing_idx = [i for i, vec in enumerate(vectors) if vec is None]
+        if missing_idx:
+            fetched = await self._afetch_embeddings(
+                [unique[i] for i in missing_idx],
+                batch_size or self.embed_batch_size,
+                max_parallel or self.embed_max_parallel,
+            )
+            self._store_embeddings(keys, vectors, missing_idx, fetched)
+
+        return vectors if inverse is None else [vectors[j] for j in inverse]
+
+    @staticmethod
+    def _dedupe(texts: list[str]) -> tuple[list[str], list[int] | None]:
+        """Unique texts in first-seen order, plus each input's index into them
+
+        The index list is None when there are no duplicates.
+        """
+        positions: dict[str, int] = {}
+        inverse = [positions.setdefault(text, len(positions)) for text in texts]
+        if len(positions) == len(texts):
+            return texts, None
+        return list(positions), inverse
+
+    def _lookup_embeddings(
+        self, texts: list[str]
+    ) -> tuple[list[bytes] | None, list[np.ndarray | None]]:
+        """Cache keys and cached vectors for texts (None where missing)"""
+        cache = self._embedding_cache()
+        if cache is None:
+            return None, [None] * len(texts)
+
+        keys = [EmbeddingCache.key(self.embedding_model, text) for text in texts]
+        return keys, cache.get_many(keys)
+
+    def _embedding_cache(self) -> EmbeddingCache | None:
+        """The on-disk embedding cache, opened on first use (None when disabled)"""
+        if self._cache is None and self._cache_embeddings:
+            with self._cache_lock:
+                if self._cache is None:
+                    self._cache = EmbeddingCache()
+        return self._cache
+
+    def _store_embeddings(
+        self,
+        keys: list[bytes] | None,
+        vectors: list[np.ndarray | None],
+        missing_idx: list[int],
+        fetched: list[np.ndarray],
+    ):
+        """Write freshly fetched vectors to the cache and into their result slots"""
+        if keys is not None:
+            self._embedding_cache().set_many([keys[i] for i in missing_idx], fetched)
+        for i, vec in zip(missing_idx, fetched):
+            vectors[i] = vec
+
+    def _fetch_embeddings(
+        self, texts: list[str], batch_size: int, max_parallel: int
+    ) -> list[np.ndarray]:
+        """Call the embedding provider in concurrent batches (no caching)"""
+        batches = [texts[i : i + batch_size] for i in range(0, len(texts), batch_size)]
+        if len(batches) <= 1 or max_parallel <= 1:
+            return [vec for batch in batches for vec in self._embed_batch(batch)]
+
+        results: list[list[np.ndarray] | None] = [None] * len(batches)
+        with ThreadPoolExecutor(max_workers=min(max_parallel, len(batches))) as executor:
+            futures = {
+                executor.submit(self._embed_batch, batch): i for i, batch in enumerate(batches)
+            }
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+
+        return [vec for batch_vectors in results for vec in batch_vectors]
+
+    async def _afetch_embeddings(
+        self, texts: list[str], batch_size: int, max_parallel: int
+    ) -> list[np.ndarray]:
+        """Async variant of `_fetch_embeddings`"""
+        batches = [texts[i : i + batch_size] for i in range(0, len(texts), batch_size)]
+        semaphore = asyncio.Semaphore(max(1, max_parallel))
+
+        async def run(batch: list[str]) -> list[np.ndarray]:
+            async with semaphore:
+                response = await aembedding(model=self.embedding_model, input=batch)
+            return self._to_vectors(response)
+
+        results = await asyncio.gather(*(run(batch) for batch in batches))
+        return [vec for batch_vectors in results for vec in batch_vectors]
+
+    def _embed_batch(self, texts: list[str]) -> list[np.ndarray]:
+        """Embed a single batch with one provider request"""
+        response = embedding(model=self.embedding_model, input=texts)
+        return self._to_vectors(response)
+
+    @staticmethod
+    def _to_vectors(response) -> list[np.ndarray]:
+        """Convert a LiteLLM embedding response to read-only float32 vectors"""
+        vectors = []
+        for item in response.data:
+            vec = np.asarray(item["embedding"], dtype=np.float32)
+            vec.setflags(write=False)
+            vectors.append(vec)
+        return vectors
+
+    def embed_single(self, text: str) -> np.ndarray:
         """Generate embedding for a single text
 
         Args:
             text: Text to embed
 
         Returns:
-            Embedding vector
+            Embedding vector (float32, read-only)
         """
+        return self._embed_single_cached(self.embedding_model, text)
+
+    def _embed_one(self, model: str, text: str) -> np.ndarray:
+        # `model` is part of the LRU key so switching embedding_model never serves stale vectors
         return self.embed([text])[0]
 
     def stream(self, messages: list[dict[str, str]], **kwargs):
@@ -140,7 +541,7 @@ class LLMClient:
         """
         response = completion(
             model=self.model,
-            messages=messages,
+            messages=self._with_prompt_cache(messages),
             stream=True,
             temperature=kwargs.get("temperature", self.temperature),
             max_tokens=kwargs.get("max_tokens", self.max_tokens),
@@ -148,11 +549,52 @@ class LLMClient:
         )
 
         for chunk in response:
-            if chunk.choices[0].delta.content:
-                yield chunk.choices[0].delta.content
+            content = chunk.choices[0].delta.content
+            if content:
+                yield content
+
+    async def astream(self, messages: list[dict[str, str]], **kwargs):
+        """Async variant of `stream` (for forwarding tokens from async servers)
+
+        Args:
+            messages: Chat messages
+            **kwargs: Additional args
+
+        Yields:
+            Response chunks
+        """
+        response = await acompletion(
+            model=self.model,
+            messages=self._with_prompt_cache(messages),
+            stream=True,
+            temperature=kwargs.get("temperature", self.temperature),
+            max_tokens=kwargs.get("max_tokens", self.max_tokens),
+            **{k: v for k, v in kwargs.items() if k not in ["temperature", "max_tokens", "stream"]},
+        )
+
+        async for chunk in response:
+            content = chunk.choices[0].delta.content
+            if content:
+                yield content
 
 
 # Convenience function for quick use
+@functools.lru_cache(maxsize=8)
+def _get_client(
+    model: str | None = None,
+    embedding_model: str | None = None,
+    temperature: float = 0.7,
+    max_tokens: int | None = None,
+) -> LLMClient:
+    """Shared LLM client for helpers that are called without one
+
+    Reusing the client keeps its embedding caches warm across calls.
+    """
+    return LLMClient(
+        model=model, embedding_model=embedding_model, temperature=temperature, max_tokens=max_tokens
+    )
+
+
 def quick_complete(prompt: str, model: str | None = None) -> str:
     """Quick one-off completion (not for production)
 
@@ -163,5 +605,5 @@ def quick_complete(prompt: str, model: str | None = None) -> str:
     Returns:
         Response text
     """
-    client = LLMClient(model=model)
+    client = _get_client(model=model)
     return client.complete([{"role": "user", "content": prompt}])
@@ -0,0 +1,41 @@
+"""Scalar quantization of embedding vectors
+
+Used by `EmbeddingCache` with VEDYUT_EMBED_CACHE_DTYPE=int8. Each vector is
+stored as int8 codes plus one float16 scale (its max absolute value / 127),
+about 4x smaller than float32. The scale is per row, unlike FAISS's QT_8bit,
+which trains a range per dimension; `GrammarRAG(quantize=...)` uses FAISS and
+not this module. Cached vectors come back with rounding error of up to half
+a scale step per component.
+"""
+
+import numpy as np
+
+
+def quantize_int8(arr: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Quantize rows to int8 with a per-row scale
+
+    Args:
+        arr: Array of shape (N, D) or (D,)
+
+    Returns:
+        (int8 array of shape (N, D), float16 scales of shape (N,))
+    """
+    arr = np.atleast_2d(np.asarray(arr, dtype=np.float32))
+    scale = (np.abs(arr).max(axis=1) / 127.0).astype(np.float16)
+    scale[scale == 0] = 1.0
+
+    q = np.rint(arr / scale[:, None].astype(np.float32))
+    return np.clip(q, -127, 127).astype(np.int8), scale
+
+
+def dequantize_int8(q: np.ndarray, scale: np.ndarray) -> np.ndarray:
+    """Inverse of `quantize_int8` (up to rounding error)
+
+    Args:
+        q: int8 array of shape (N, D)
+        scale: Per-row scales of shape (N,)
+
+    Returns:
+        float32 array of shape (N, D)
+    """
+    return q.astype(np.float32) * np.asarray(scale, dtype=np.float32)[:, None]
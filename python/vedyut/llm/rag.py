@@ -13,16 +13,218 @@ The LLM can then:
 4. Cross-reference multiple sources
 """
 
+import asyncio
+import functools
 import json
-from dataclasses import asdict, dataclass
+import mmap
+import os
+import random
+import re
+import tempfile
+import uuid
+from collections import OrderedDict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, fields
 from pathlib import Path
 
 import numpy as np
 
+from .cache import SemanticCache
 from .client import LLMClient
 
+# Chunks per embedding request in build_index, and max random delay before each
+# request so concurrent batches do not hit provider rate limits in one burst
+_INDEX_BATCH = 100
+_INDEX_JITTER_S = 0.1
+
+# FAISS scalar quantizer type for each `quantize` option
+_SQ_TYPES = {"int8": "QT_8bit", "float16": "QT_fp16"}
+# Candidates re-scored in float32 after a quantized scan
+_RERANK_CANDIDATES = 100
+
+# Paragraph separator: a blank line (CRLF files are split the same way)
+_PARAGRAPH_BREAK = re.compile(rb"\r?\n\r?\n")
+
+# Sūtra numbers like 1.1.1 or 3.2.123 (looked for near the start of a chunk)
+_SUTRA_RE = re.compile(r"\b(\d+\.\d+\.\d+)\b")
+
+# Topic keywords, highest priority first (a chunk gets the first topic that matches)
+_TOPICS = [
+    ("sandhi", ["sandhi", "सन्धि"]),
+    ("lakara", ["lakara", "लकार", "tense", "वृत्ति"]),
+    ("dhatu", ["dhatu", "धातु", "verb", "root"]),
+    ("vibhakti", ["vibhakti", "विभक्ति", "case"]),
+    ("samasa", ["samasa", "समास", "compound"]),
+]
+_TOPIC_RANK = {word: rank for rank, (_, words) in enumerate(_TOPICS) for word in words}
+# One pass over the text finds every keyword occurrence (the lookahead also
+# catches keywords that overlap each other). ASCII case folding only: full Unicode
+# folding also matches e.g. "ſandhi" (long s), which .lower() cannot map back.
+_TOPIC_RE = re.compile(
+    "(?=(" + "|".join(re.escape(word) for _, words in _TOPICS for word in words) + "))",
+    re.IGNORECASE | re.ASCII,
+)
+
+# Recent exact (normalized) queries whose results are kept
+_QUERY_CACHE_SIZE = 1024
+
+# Prompt contexts kept by format_context
+_CONTEXT_CACHE_SIZE = 256
+
+# Queries warmed by build_index (one per line, not part of the corpus)
+_WARM_QUERIES_FILE = "warm_queries.txt"
+
+# Stable system prompts come first (and never embed per-call values) so providers
+# with prefix caching can reuse them; bump the version suffix when editing.
+_CODE_SYSTEM_PROMPT_V1 = """You are a Sanskrit NLP expert. Based on the Pāṇinian grammar rules provided, generate code in the requested programming language to implement the requested functionality.
+
+Generate clean, well-commented code. Include:
+1. Function signature with types
+2. Implementation logic
+3. Comments explaining the grammar rule
+4. Example usage in comments
+"""
+
+_EXPLAIN_SYSTEM_PROMPT_V1 = """Explain the Pāṇinian grammar rule in the provided grammar text in simple, clear English.
+
+Provide:
+1. What the rule says
+2. When it applies
+3. A simple example
+4. Common mistakes
+"""
+
+# Neighbours per node in the HNSW graph
+_HNSW_M = 32
+# Filtered queries fetch this many ANN neighbours per requested result
+_ANN_OVERSAMPLE = 4
+# Below this many rows SimSIMD beats BLAS matvec setup cost; above it BLAS wins
+_SIMSIMD_MAX_ROWS = 4096
+# aquery calls arriving within this window share one matrix product; a full
+# batch is scored immediately
+_COALESCE_WINDOW_S = 0.005
+_COALESCE_MAX_BATCH = 64
+
+try:
+    import faiss
+
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
+try:
+    from numba import njit, prange
+
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+try:
+    import simsimd
+
+    SIMSIMD_AVAILABLE = True
+except ImportError:
+    SIMSIMD_AVAILABLE = False
+
+
+if NUMBA_AVAILABLE:
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _topk_cosine_numba(matrix, q, k):
+        n, d = matrix.shape
+        scores = np.empty(n, dtype=np.float32)
+        for i in prange(n):
+            acc = np.float32(0.0)
+            for j in range(d):
+                acc += matrix[i, j] * q[j]
+            scores[i] = acc
+
+        # Min-heap of the k best scores so far; the root is the weakest survivor
+        heap_scores = np.full(k, -np.inf, dtype=np.float32)
+        heap_idx = np.full(k, -1, dtype=np.int64)
+        for i in range(n):
+            score = scores[i]
+            if score <= heap_scores[0]:
+                continue
+            heap_scores[0] = score
+            heap_idx[0] = i
+            pos = 0
+            while True:
+                child = 2 * pos + 1
+                if child >= k:
+                    break
+                if child + 1 < k and heap_scores[child + 1] < heap_scores[child]:
+                    child += 1
+                if heap_scores[child] >= heap_scores[pos]:
+                    break
+                heap_scores[pos], heap_scores[child] = heap_scores[child], heap_scores[pos]
+                heap_idx[pos], heap_idx[child] = heap_idx[child], heap_idx[pos]
+                pos = child
+
+        order = np.argsort(-heap_scores)
+        return heap_idx[order], heap_scores[order]
+
+
+def dot_scores(matrix: np.ndarray, q: np.ndarray) -> np.ndarray:
+    """Inner product of every row with q (cosine for unit-length inputs)
+
+    Small matrices use SimSIMD's dot kernels when installed (no BLAS call
+    overhead); otherwise, and for large matrices, BLAS matvec.
+
+    Args:
+        matrix: float32 array of shape (N, D)
+        q: float32 vector of shape (D,)
+
+    Returns:
+        float32 array of shape (N,)
+    """
+    # A float64 query would promote the whole product to float64 (a copy of the
+    # matrix); as float32 the matvec is a single sgemv over the matrix in place
+    q = np.ascontiguousarray(q, dtype=np.float32)
+    if SIMSIMD_AVAILABLE and len(matrix) < _SIMSIMD_MAX_ROWS:
+        return np.asarray(simsimd.cdist(q[None, :], matrix, metric="dot"), dtype=np.float32)[0]
+    return matrix @ q
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest scores, best first
+
+    O(N) selection with argpartition, then a sort of just the k winners.
+    """
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    idx = np.argpartition(-scores, k - 1)[:k]
+    return idx[np.argsort(-scores[idx], kind="stable")]
+
+
+def topk_cosine(matrix: np.ndarray, q: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """Top-k rows of a row-normalized matrix by cosine similarity to a unit vector
+
+    Uses a parallel Numba kernel when available, else `dot_scores` + argpartition.
 
-@dataclass
+    Args:
+        matrix: float32 array of shape (N, D) with L2-normalized rows
+        q: L2-normalized float32 query vector of shape (D,)
+        k: Number of results
+
+    Returns:
+        (indices, scores), best first
+    """
+    k = min(k, len(matrix))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+    if NUMBA_AVAILABLE:
+        return _topk_cosine_numba(matrix, q, k)
+
+    scores = dot_scores(matrix, q)
+    idx = top_k_indices(scores, k)
+    return idx, scores[idx]
+
+
+@dataclass(slots=True)
 class GrammarChunk:
     """A chunk of grammar text with metadata"""
 
@@ -32,7 +234,177 @@ class GrammarChunk:
     sutra_number: str | None = None  # e.g., "1.1.1", "3.2.123"
     topic: str | None = None  # e.g., "sandhi", "lakara", "dhatu"
     language: str = "sanskrit"  # "sanskrit" or "english"
-    embedding: list[float] | None = None
+
+
+# Embeddings live in GrammarRAG.chunk_embeddings (row i belongs to chunks[i])
+# Texts are saved separately (see GrammarRAG._save_index), so JSON holds only these
+_CHUNK_META_FIELDS = tuple(f.name for f in fields(GrammarChunk) if f.name != "text")
+
+
+def _normalize_query(text: str) -> str:
+    """Result-cache key form of a query: trimmed, with internal whitespace collapsed
+
+    Case is kept because it is significant in SLP1 and Harvard-Kyoto input.
+    """
+    return " ".join(text.split())
+
+
+def _unit(vec: np.ndarray) -> np.ndarray:
+    """`vec` as a unit-length float32 vector (zero vectors are returned as-is)"""
+    # Rows are unit length (see _prepare_search), so cosine is a single matvec.
+    # Scaling the D-length query is cheaper than scaling the N-length scores, and
+    # most embedding APIs already return unit vectors, which are passed through.
+    q = np.asarray(vec, dtype=np.float32)
+    norm = float(np.linalg.norm(q))
+    if not norm or abs(norm - 1.0) < 1e-6:
+        return q
+    return q * (1.0 / norm)
+
+
+def _normalize_rows(arr: np.ndarray) -> np.ndarray:
+    """Contiguous float32 copy of `arr` with L2-normalized rows"""
+    arr = np.ascontiguousarray(arr, dtype=np.float32)
+    arr /= np.maximum(np.linalg.norm(arr, axis=1, keepdims=True), 1e-12)
+    return arr
+
+
+def _umask() -> int:
+    """The process umask (reading it requires setting it, so it is set straight back)"""
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+@contextmanager
+def _replacing(path: Path) -> Iterator[Path]:
+    """Yield a temporary path next to `path` that atomically replaces it on success
+
+    Other processes may have the old file memory-mapped; swapping in a new file
+    (instead of truncating and rewriting the old one) leaves their mapping intact.
+    The new file gets the permissions a plain open() would have given it.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    os.close(fd)
+    tmp = Path(tmp)
+    try:
+        yield tmp
+        # mkstemp creates the file owner-only (0600); index files are read by other
+        # users too (e.g. API workers reading an index built by a deploy step)
+        os.chmod(tmp, 0o666 & ~_umask())
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def _read_faiss_index(path: Path):
+    """Read a FAISS index, memory-mapped where the index type supports it"""
+    try:
+        return faiss.read_index(str(path), faiss.IO_FLAG_MMAP)
+    except RuntimeError:
+        return faiss.read_index(str(path))
+
+
+def _read_texts(file_path: Path, offsets: np.ndarray) -> list[str]:
+    """Decode the UTF-8 texts stored back to back in a file
+
+    Args:
+        file_path: Concatenated UTF-8 texts
+        offsets: int64 array of N + 1 byte offsets; text i is [offsets[i], offsets[i + 1])
+    """
+    bounds = offsets.tolist()
+    if bounds[-1] == 0:
+        return [""] * (len(bounds) - 1)
+
+    with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        return [buf[start:end].decode("utf-8") for start, end in zip(bounds, bounds[1:])]
+
+
+def _paragraph_spans(buf) -> Iterator[tuple[int, int]]:
+    """Lazily yield [start, end) byte offsets of blank-line separated paragraphs
+
+    Args:
+        buf: bytes-like buffer (e.g. an mmap of a UTF-8 file); separators are
+            ASCII so offsets always fall on UTF-8 character boundaries
+    """
+    start = 0
+    for match in _PARAGRAPH_BREAK.finditer(buf):
+        yield start, match.start()
+        start = match.end()
+    yield start, len(buf)
+
+
+def _iter_paragraphs(file_path: Path) -> Iterator[str]:
+    """Yield the non-empty, stripped paragraphs of a UTF-8 text file
+
+    The file is scanned as bytes over an mmap and paragraphs are decoded one
+    at a time, so memory use is bounded by a single paragraph rather than the
+    whole decoded text.
+    """
+    with open(file_path, "rb") as f:
+        if f.seek(0, 2) == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            crlf = buf.find(b"\r") != -1
+            for start, end in _paragraph_spans(buf):
+                para = buf[start:end].decode("utf-8").strip()
+                if para:
+                    yield para.replace("\r\n", "\n") if crlf else para
+
+
+class _QueryCoalescer:
+    """Scores concurrent exact-search queries with one gemm instead of one matvec each
+
+    Each pending request is a (query vector, future) pair; the batch is flushed
+    by a timer on the running event loop, so there is no background task to
+    start or cancel. The matmul itself runs in the loop's default executor
+    (BLAS releases the GIL), so a large batch never blocks other coroutines.
+    """
+
+    def __init__(self, rag: "GrammarRAG"):
+        self._rag = rag
+        self._pending: list[tuple[np.ndarray, asyncio.Future]] = []
+        self._flush_handle: asyncio.TimerHandle | None = None
+
+    async def scores(self, q: np.ndarray) -> np.ndarray:
+        """Similarities of every chunk to the unit-length query `q`"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((q, future))
+        if len(self._pending) >= _COALESCE_MAX_BATCH:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(_COALESCE_WINDOW_S, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        queries = np.stack([q for q, _ in batch]).astype(np.float32, copy=False)
+        scored = asyncio.get_running_loop().run_in_executor(None, self._score_batch, queries)
+        scored.add_done_callback(functools.partial(self._resolve, batch))
+
+    def _score_batch(self, queries: np.ndarray) -> np.ndarray:
+        # (n_chunks, b): the corpus matrix is read once for the whole batch
+        return self._rag.chunk_embeddings @ queries.T
+
+    @staticmethod
+    def _resolve(batch: list[tuple[np.ndarray, asyncio.Future]], scored: asyncio.Future):
+        error = None if scored.cancelled() else scored.exception()
+        for j, (_, future) in enumerate(batch):
+            if future.done():
+                continue
+            if scored.cancelled():
+                future.cancel()
+            elif error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(scored.result()[:, j])
 
 
 class GrammarRAG:
@@ -55,20 +427,82 @@ class GrammarRAG:
         data_dir: str = "data/grammar",
         llm_client: LLMClient | None = None,
         index_file: str = "grammar_index.json",
+        quantize: str | None = None,
+        semantic_cache: bool = False,
     ):
         """Initialize RAG system
 
         Args:
             data_dir: Directory containing grammar text files
             llm_client: LLM client for embeddings and generation
-            index_file: File to save/load embedded chunks
+            index_file: File to save/load chunks; it names the data files of the
+                index (embeddings, texts, FAISS indexes) saved next to it
+            quantize: Search over an int8 ("int8", 4x smaller) or float16 ("float16",
+                2x smaller) FAISS scalar-quantized copy of the embeddings and re-rank
+                the best candidates in float32 (requires faiss); None searches float32
+                directly (through a FAISS HNSW index when faiss is installed)
+            semantic_cache: Reuse retrievals and explain_rule answers for near-duplicate
+                queries (cosine >= VEDYUT_SEMCACHE_THRESHOLD). Off by default: queries
+                that differ in one detail (e.g. "sūtra 6.1.87" vs "6.1.88") can embed
+                above the threshold and would get each other's answers.
         """
+        if quantize is not None and quantize not in _SQ_TYPES:
+            raise ValueError(f"Unsupported quantization: {quantize}")
+        if quantize is not None and not FAISS_AVAILABLE:
+            raise ImportError("Quantized search requires faiss: pip install 'vedyut[fast]'")
+
         self.data_dir = Path(data_dir)
         self.llm = llm_client or LLMClient()
         self.index_file = self.data_dir / index_file
+        # Id in the names of the data files saved with index_file (see _save_index)
+        self._build: str | None = None
+        self.quantize = quantize
+        self.semantic_cache = SemanticCache() if semantic_cache else None
 
         self.chunks: list[GrammarChunk] = []
         self.chunk_embeddings: np.ndarray | None = None
+        self._sq_index = None  # faiss.IndexScalarQuantizer (quantize set)
+        self._ann_index = None  # faiss.IndexHNSWFlat, row ids match self.chunks
+        # (normalized query, top_k, topic, language) -> results, least recent first
+        self._query_cache: OrderedDict[tuple, list[tuple[GrammarChunk, float]]] = OrderedDict()
+        # (chunk (source, sūtra, text) tuples, labeled) -> prompt context built by format_context
+        self._context_cache: OrderedDict[tuple, str] = OrderedDict()
+        self._topics: np.ndarray | None = None  # chunk.topic per row (object array)
+        self._languages: np.ndarray | None = None  # chunk.language per row (object array)
+        self._coalescer = _QueryCoalescer(self)
+
+    @property
+    def embeddings_file(self) -> Path:
+        return self._index_path(self._build, ".npy")
+
+    @property
+    def texts_file(self) -> Path:
+        return self._index_path(self._build, ".texts.bin")
+
+    @property
+    def text_offsets_file(self) -> Path:
+        return self._index_path(self._build, ".offsets.npy")
+
+    @property
+    def ann_index_file(self) -> Path:
+        return self._index_path(self._build, ".faiss")
+
+    @property
+    def quantized_index_file(self) -> Path | None:
+        if self.quantize is None:
+            return None
+        return self._index_path(self._build, f".{self.quantize}.faiss")
+
+    def _index_path(self, build: str | None, suffix: str) -> Path:
+        """Data file of a saved index, e.g. grammar_index.<build>.npy"""
+        stem = self.index_file.stem if build is None else f"{self.index_file.stem}.{build}"
+        return self.index_file.with_name(stem + suffix)
+
+    def _build_files(self, build: str | None) -> list[Path]:
+        """Every data file a saved index may have (some are optional)"""
+        suffixes = [".npy", ".texts.bin", ".offsets.npy", ".faiss"]
+        suffixes += [f".{quantize}.faiss" for quantize in _SQ_TYPES]
+        return [self._index_path(build, suffix) for suffix in suffixes]
 
     def load_texts(self):
         """Load grammar treatises from data directory
@@ -80,6 +514,7 @@ class GrammarRAG:
                 kale_grammar.txt      # English textbook
                 panini_intro.txt      # Modern English explanations
                 custom_rules.json     # Custom rule definitions
+                warm_queries.txt      # Optional: queries to warm (see `warm`)
         """
         if not self.data_dir.exists():
             print(f"Warning: Grammar data directory not found: {self.data_dir}")
@@ -88,7 +523,8 @@ class GrammarRAG:
 
         # Load text files
         for file_path in self.data_dir.glob("*.txt"):
-            self._load_text_file(file_path)
+            if file_path.name != _WARM_QUERIES_FILE:
+                self._load_text_file(file_path)
 
         # Load structured JSON files
         for file_path in self.data_dir.glob("*.json"):
@@ -101,13 +537,8 @@ class GrammarRAG:
         source = file_path.stem  # e.g., "ashtadhyayi", "kale_grammar"
         language = "sanskrit" if any(x in source for x in ["ashtadhyayi", "kashika"]) else "english"
 
-        with open(file_path, encoding="utf-8") as f:
-            content = f.read()
-
         # Simple chunking by paragraphs (TODO: improve with sutra-aware chunking)
-        paragraphs = [p.strip() for p in content.split("\n\n") if p.strip()]
-
-        for i, para in enumerate(paragraphs):
+        for i, para in enumerate(_iter_paragraphs(file_path)):
             chunk = GrammarChunk(
                 id=f"{source}_{i}",
                 text=para,
@@ -163,36 +594,33 @@ class GrammarRAG:
 
     def _extract_sutra_number(self, text: str) -> str | None:
         """Extract sūtra number from text (e.g., '1.1.1', '3.2.123')"""
-        import re
-
-        match = re.search(r"\b(\d+\.\d+\.\d+)\b", text[:100])
+        # endpos bounds the scan to the first 100 characters without slicing
+        match = _SUTRA_RE.search(text, 0, 100)
         return match.group(1) if match else None
 
     def _infer_topic(self, text: str) -> str | None:
         """Infer grammatical topic from text content"""
-        text_lower = text.lower()
-        if any(word in text_lower for word in ["sandhi", "सन्धि"]):
-            return "sandhi"
-        elif any(word in text_lower for word in ["lakara", "लकार", "tense", "वृत्ति"]):
-            return "lakara"
-        elif any(word in text_lower for word in ["dhatu", "धातु", "verb", "root"]):
-            return "dhatu"
-        elif any(word in text_lower for word in ["vibhakti", "विभक्ति", "case"]):
-            return "vibhakti"
-        elif any(word in text_lower for word in ["samasa", "समास", "compound"]):
-            return "samasa"
-        return None
-
-    def build_index(self, force_rebuild: bool = False):
+        best = None
+        for match in _TOPIC_RE.finditer(text):
+            rank = _TOPIC_RANK[match.group(1).lower()]
+            if best is None or rank < best:
+                best = rank
+                if rank == 0:
+                    break
+        return None if best is None else _TOPICS[best][0]
+
+    def build_index(self, force_rebuild: bool = False, concurrency: int = 5):
         """Generate embeddings for all chunks and build search index
 
         Args:
             force_rebuild: If True, rebuild even if index exists
+            concurrency: Max embedding requests in flight
         """
         # Try to load existing index
         if not force_rebuild and self.index_file.exists():
             self._load_index()
             print(f"Loaded existing index from {self.index_file}")
+            self.warm()
             return
 
         if not self.chunks:
@@ -200,44 +628,262 @@ class GrammarRAG:
             return
 
         print(f"Generating embeddings for {len(self.chunks)} chunks...")
-        texts = [chunk.text for chunk in self.chunks]
-
-        # Generate embeddings in batches (API rate limits)
-        batch_size = 100
-        all_embeddings = []
-
-        for i in range(0, len(texts), batch_size):
-            batch = texts[i : i + batch_size]
-            embeddings = self.llm.embed(batch)
-            all_embeddings.extend(embeddings)
-            print(f"  Embedded {min(i + batch_size, len(texts))}/{len(texts)}")
 
-        # Store embeddings in chunks
-        for chunk, embedding in zip(self.chunks, all_embeddings):
-            chunk.embedding = embedding
+        # Sūtras repeat across treatises and commentaries: embed each text once
+        positions: dict[str, int] = {}
+        rows = np.array(
+            [positions.setdefault(chunk.text, len(positions)) for chunk in self.chunks],
+            dtype=np.int64,
+        )
+        texts = list(positions)
 
-        self.chunk_embeddings = np.array(all_embeddings)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            embeddings = asyncio.run(self._embed_texts_async(texts, concurrency))
+        else:
+            # Already inside an event loop (e.g. Jupyter): the client batches on threads
+            embeddings = self.llm.embed_array(texts)
+        # Normalize once so cosine similarity is a plain dot product at query time
+        self.chunk_embeddings = _normalize_rows(
+            embeddings if len(texts) == len(rows) else embeddings[rows]
+        )
 
         # Save index
         self._save_index()
         print(f"Index saved to {self.index_file}")
 
+        if self.quantize is not None:
+            # Search runs on the quantized codes; the float32 rows are only read for
+            # re-ranking, so leave them on disk instead of in memory
+            self.chunk_embeddings = np.load(self.embeddings_file, mmap_mode="r").view(np.ndarray)
+        self._prepare_search(rebuild=True, normalized=True)
+        self.warm()
+
+    def warm(self, queries: list[str] | None = None, top_k: int = 5) -> int:
+        """Pre-compute embeddings and retrievals for expected queries
+
+        Called by `build_index` with the queries listed one per line in
+        `<data_dir>/warm_queries.txt` (if present), so the first real request for
+        a common question is served locally instead of waiting on the provider.
+
+        Args:
+            queries: Queries to warm (default: read warm_queries.txt)
+            top_k: top_k the warmed retrievals are cached for
+
+        Returns:
+            Number of queries warmed
+        """
+        if queries is None:
+            warm_file = self.data_dir / _WARM_QUERIES_FILE
+            if not warm_file.exists():
+                return 0
+            with open(warm_file, encoding="utf-8") as f:
+                queries = [line.strip() for line in f]
+            queries = [q for q in queries if q and not q.startswith("#")]
+
+        if not queries or self.chunk_embeddings is None:
+            return 0
+
+        # One batched request embeds every query; each is then searched locally
+        vectors = self.llm.embed(queries)
+        for query_text, vector in zip(queries, vectors):
+            exact_key = (_normalize_query(query_text), top_k, None, None)
+            if exact_key not in self._query_cache:
+                query_vec = np.asarray(vector, dtype=np.float32)
+                self._retrieve(exact_key, query_vec, top_k, None, None)
+        return len(queries)
+
+    async def _embed_texts_async(self, texts: list[str], concurrency: int) -> np.ndarray:
+        """Embed texts in batches with up to `concurrency` requests in flight"""
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        batches = [texts[i : i + _INDEX_BATCH] for i in range(0, len(texts), _INDEX_BATCH)]
+        done = 0
+
+        async def embed_batch(batch: list[str]) -> np.ndarray:
+            nonlocal done
+            async with semaphore:
+                await asyncio.sleep(random.uniform(0, _INDEX_JITTER_S))
+                vectors = await self.llm.aembed(batch)
+            done += len(batch)
+            print(f"  Embedded {done}/{len(texts)}")
+            return np.stack(vectors)
+
+        # gather preserves input order, so rows line up with self.chunks
+        return np.concatenate(await asyncio.gather(*(embed_batch(b) for b in batches)))
+
     def _save_index(self):
-        """Save chunks and embeddings to disk"""
+        """Save chunk metadata (JSON), texts (UTF-8 blob + offsets) and embeddings (.npy)
+
+        Each save writes its data files under a fresh build id and only then swaps
+        in the JSON that references them, so a reader (or a crash) mid-save sees
+        either the old index or the new one, never a mix. The previous build's files
+        are removed afterwards; processes that still map them keep their copy.
+        """
         self.data_dir.mkdir(parents=True, exist_ok=True)
+        previous = self._saved_build() if self.index_file.exists() else None
+        self._build = uuid.uuid4().hex[:12]
+
+        # Embeddings are stored normalized, so loading needs no extra pass
+        with _replacing(self.embeddings_file) as tmp, open(tmp, "wb") as f:
+            np.save(f, np.asarray(self.chunk_embeddings, dtype=np.float32))
+
+        # Texts (the bulk of the index) are raw UTF-8, so loading does no JSON unescaping
+        encoded = [chunk.text.encode("utf-8") for chunk in self.chunks]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(text) for text in encoded], out=offsets[1:])
+        with _replacing(self.texts_file) as tmp, open(tmp, "wb") as f:
+            f.writelines(encoded)
+        with _replacing(self.text_offsets_file) as tmp, open(tmp, "wb") as f:
+            np.save(f, offsets)
+
+        chunks = [
+            {name: getattr(chunk, name) for name in _CHUNK_META_FIELDS} for chunk in self.chunks
+        ]
 
-        data = {"chunks": [asdict(chunk) for chunk in self.chunks], "version": "1.0"}
+        data = {
+            "chunks": chunks,
+            "texts": {"file": self.texts_file.name, "offsets": self.text_offsets_file.name},
+            "embeddings": {
+                "file": self.embeddings_file.name,
+                "dtype": "float32",
+                "shape": list(self.chunk_embeddings.shape),
+            },
+            "build": self._build,
+            "version": "2.0",
+        }
 
-        with open(self.index_file, "w", encoding="utf-8") as f:
+        # The JSON swap commits the new index
+        with _replacing(self.index_file) as tmp, open(tmp, "w", encoding="utf-8") as f:
             json.dump(data, f, ensure_ascii=False, indent=2)
 
+        # Data files of the previous build, including FAISS indexes derived from its
+        # embeddings (build_index recreates the one it uses for the new build)
+        if previous is not False:
+            for path in self._build_files(previous):
+                path.unlink(missing_ok=True)
+
+    def _saved_build(self) -> str | None | bool:
+        """Build id of the index JSON on disk (None for unnamed files, False if unreadable)"""
+        try:
+            with open(self.index_file, encoding="utf-8") as f:
+                return json.load(f).get("build")
+        except (OSError, ValueError, AttributeError):
+            return False
+
     def _load_index(self):
-        """Load chunks and embeddings from disk"""
+        """Load chunks and embeddings from disk
+
+        Embeddings are memory-mapped read-only, so processes on the same host
+        (e.g. several API workers) share one copy through the OS page cache.
+        """
         with open(self.index_file, encoding="utf-8") as f:
             data = json.load(f)
 
-        self.chunks = [GrammarChunk(**chunk) for chunk in data["chunks"]]
-        self.chunk_embeddings = np.array([chunk.embedding for chunk in self.chunks])
+        records = data["chunks"]
+        self._build = data.get("build")
+        legacy = data.get("version") == "1.0"
+        if legacy:
+            # Legacy index with embeddings inlined in the JSON: copy them into a
+            # preallocated matrix row by row, releasing each list once copied
+            dim = len(records[0]["embedding"]) if records else 0
+            legacy_embeddings = np.empty((len(records), dim), dtype=np.float32)
+            for i, record in enumerate(records):
+                legacy_embeddings[i] = record.pop("embedding")
+        if "texts" in data:
+            offsets = np.load(self.data_dir / data["texts"]["offsets"])
+            if len(offsets) != len(records) + 1:
+                raise ValueError(
+                    f"Index {self.index_file} has {len(records)} chunks but its text "
+                    f"offsets describe {max(len(offsets) - 1, 0)}; rebuild with "
+                    "build_index(force_rebuild=True)"
+                )
+            texts = _read_texts(self.data_dir / data["texts"]["file"], offsets)
+            for record, text in zip(records, texts):
+                record["text"] = text
+        self.chunks = [GrammarChunk(**record) for record in records]
+
+        if legacy:
+            self.chunk_embeddings = legacy_embeddings
+            self._prepare_search()
+            return
+
+        embeddings = np.load(self.data_dir / data["embeddings"]["file"], mmap_mode="r")
+        if embeddings.shape != tuple(data["embeddings"]["shape"]) or len(embeddings) != len(
+            records
+        ):
+            raise ValueError(
+                f"Index {self.index_file} does not match its embeddings file "
+                f"({len(records)} chunks, shape {list(data['embeddings']['shape'])}, "
+                f"found {list(embeddings.shape)}); rebuild with build_index(force_rebuild=True)"
+            )
+        self.chunk_embeddings = embeddings.view(np.ndarray)
+        self._prepare_search(normalized=True)
+
+    def _prepare_search(self, rebuild: bool = False, normalized: bool = False):
+        """Derive search structures from chunk_embeddings (after build or load)
+
+        Args:
+            rebuild: Rebuild the ANN index instead of loading it from disk
+            normalized: Rows are already unit length (e.g. a memory-mapped saved index)
+        """
+        # Cached retrievals refer to the previous chunk list
+        self._query_cache.clear()
+        self._context_cache.clear()
+        if self.semantic_cache is not None:
+            self.semantic_cache.clear()
+
+        # Column copies of the filterable fields, so filters are array comparisons
+        self._topics = np.array([chunk.topic for chunk in self.chunks], dtype=object)
+        self._languages = np.array([chunk.language for chunk in self.chunks], dtype=object)
+
+        # Normalize once so cosine similarity is a plain dot product at query time
+        if not normalized:
+            self.chunk_embeddings = _normalize_rows(self.chunk_embeddings)
+
+        self._ann_index = self._sq_index = None
+        if self.quantize is not None:
+            self._sq_index = self._prepare_sq_index(rebuild)
+        elif FAISS_AVAILABLE:
+            self._ann_index = self._prepare_ann_index(rebuild)
+
+    def _prepare_sq_index(self, rebuild: bool):
+        """Load the persisted scalar-quantized index, or build and persist a fresh one"""
+        if not rebuild and self.quantized_index_file.exists():
+            index = _read_faiss_index(self.quantized_index_file)
+            if index.ntotal == len(self.chunks):
+                return index
+
+        # int8 stores one byte per dimension with per-dimension ranges learned from
+        # the data, float16 two; inner product on normalized vectors is cosine similarity
+        index = faiss.IndexScalarQuantizer(
+            self.chunk_embeddings.shape[1],
+            getattr(faiss.ScalarQuantizer, _SQ_TYPES[self.quantize]),
+            faiss.METRIC_INNER_PRODUCT,
+        )
+        index.train(self.chunk_embeddings)
+        index.add(self.chunk_embeddings)
+
+        with _replacing(self.quantized_index_file) as tmp:
+            faiss.write_index(index, str(tmp))
+        return index
+
+    def _prepare_ann_index(self, rebuild: bool):
+        """Load the persisted HNSW index, or build and persist a fresh one"""
+        if not rebuild and self.ann_index_file.exists():
+            index = _read_faiss_index(self.ann_index_file)
+            if index.ntotal == len(self.chunks):
+                return index
+
+        # Inner product on normalized vectors is cosine similarity
+        index = faiss.IndexHNSWFlat(
+            self.chunk_embeddings.shape[1], _HNSW_M, faiss.METRIC_INNER_PRODUCT
+        )
+        index.add(self.chunk_embeddings)
+
+        with _replacing(self.ann_index_file) as tmp:
+            faiss.write_index(index, str(tmp))
+        return index
 
     def query(
         self,
@@ -245,6 +891,7 @@ class GrammarRAG:
         top_k: int = 5,
         topic: str | None = None,
         language: str | None = None,
+        cache: bool = True,
     ) -> list[tuple[GrammarChunk, float]]:
         """Retrieve most relevant grammar chunks for a query
 
@@ -253,6 +900,8 @@ class GrammarRAG:
             top_k: Number of results to return
             topic: Filter by topic ("sandhi", "lakara", etc.)
             language: Filter by language ("sanskrit" or "english")
+            cache: Serve repeated (and near-duplicate) queries from cache; pass
+                False to always search the index
 
         Returns:
             List of (chunk, similarity_score) tuples, sorted by relevance
@@ -260,33 +909,268 @@ class GrammarRAG:
         if self.chunk_embeddings is None:
             raise ValueError("Index not built. Run build_index() first.")
 
+        # Exact repeats skip even the embedding lookup
+        exact_key = (_normalize_query(query_text), top_k, topic, language)
+        if cache:
+            cached = self._cached_query(exact_key)
+            if cached is not None:
+                return cached
+
         # Generate query embedding
-        query_embedding = self.llm.embed_single(query_text)
-        query_vec = np.array(query_embedding)
+        query_vec = self._embed_query(query_text)
+        if not cache:
+            return self._search(query_vec, top_k, topic, language)
+        return list(self._retrieve(exact_key, query_vec, top_k, topic, language))
 
-        # Compute cosine similarity
-        similarities = np.dot(self.chunk_embeddings, query_vec) / (
-            np.linalg.norm(self.chunk_embeddings, axis=1) * np.linalg.norm(query_vec)
-        )
+    async def aquery(
+        self,
+        query_text: str,
+        top_k: int = 5,
+        topic: str | None = None,
+        language: str | None = None,
+        cache: bool = True,
+    ) -> list[tuple[GrammarChunk, float]]:
+        """Async `query`; concurrent calls share one batched similarity matmul
+
+        Exact scans from calls arriving within a few milliseconds of each other
+        are stacked into a single `chunk_embeddings @ Q.T`, so the corpus
+        matrix is read once per batch instead of once per query.
+        """
+        if self.chunk_embeddings is None:
+            raise ValueError("Index not built. Run build_index() first.")
+
+        exact_key = (_normalize_query(query_text), top_k, topic, language)
+        if cache:
+            cached = self._cached_query(exact_key)
+            if cached is not None:
+                return cached
+
+        vectors = await self.llm.aembed([query_text])
+        query_vec = np.asarray(vectors[0], dtype=np.float32)
+
+        cache_key = ("query", top_k, topic, language)
+        results = None
+        if cache and self.semantic_cache is not None:
+            results = self.semantic_cache.get(query_vec, cache_key)
+
+        if results is None:
+            results = await self._asearch(query_vec, top_k, topic, language)
+            if cache and self.semantic_cache is not None:
+                self.semantic_cache.put(query_vec, cache_key, results)
+
+        if cache:
+            self._cache_query(exact_key, results)
+        return list(results)
+
+    def _retrieve(
+        self,
+        exact_key: tuple,
+        query_vec: np.ndarray,
+        top_k: int,
+        topic: str | None,
+        language: str | None,
+    ) -> list[tuple[GrammarChunk, float]]:
+        """Search for an embedded query through the semantic cache, caching the results"""
+        cache_key = ("query", top_k, topic, language)
+        results = None
+        if self.semantic_cache is not None:
+            results = self.semantic_cache.get(query_vec, cache_key)
+
+        if results is None:
+            results = self._search(query_vec, top_k, topic, language)
+            if self.semantic_cache is not None:
+                self.semantic_cache.put(query_vec, cache_key, results)
+
+        self._cache_query(exact_key, results)
+        return results
+
+    def _cached_query(self, exact_key: tuple) -> list[tuple[GrammarChunk, float]] | None:
+        """A copy of the cached results for `exact_key`, refreshing its LRU position"""
+        cached = self._query_cache.get(exact_key)
+        if cached is None:
+            return None
+        self._query_cache.move_to_end(exact_key)
+        return list(cached)
+
+    def _cache_query(self, exact_key: tuple, results: list[tuple[GrammarChunk, float]]):
+        self._query_cache[exact_key] = results
+        if len(self._query_cache) > _QUERY_CACHE_SIZE:
+            self._query_cache.popitem(last=False)
+
+    def _embed_query(self, query_text: str) -> np.ndarray:
+        """Embed a query as a float32 vector"""
+        return np.asarray(self.llm.embed_single(query_text), dtype=np.float32)
+
+    def _search(
+        self,
+        query_vec: np.ndarray,
+        top_k: int,
+        topic: str | None,
+        language: str | None,
+    ) -> list[tuple[GrammarChunk, float]]:
+        """Rank chunks against a query embedding (see `query`)"""
+        if top_k <= 0:
+            return []
+        q = _unit(query_vec)
+        if self._sq_index is not None:
+            return self._sq_search(q, top_k, topic, language)
+
+        results = self._ann_search(q, top_k, topic, language)
+        if results is not None:
+            return results
+
+        # Unfiltered search without an ANN index goes to the top-k kernel
+        if not topic and not language:
+            top_idx, top_scores = topk_cosine(self.chunk_embeddings, q, top_k)
+            return [(self.chunks[i], float(score)) for i, score in zip(top_idx, top_scores)]
+
+        similarities = dot_scores(self.chunk_embeddings, q)
+        return self._rank(similarities, top_k, topic, language)
+
+    async def _asearch(
+        self,
+        query_vec: np.ndarray,
+        top_k: int,
+        topic: str | None,
+        language: str | None,
+    ) -> list[tuple[GrammarChunk, float]]:
+        """`_search`, with float32 exact scans batched through the coalescer"""
+        if top_k <= 0:
+            return []
+        q = _unit(query_vec)
+        if self._sq_index is not None:
+            return await asyncio.to_thread(self._sq_search, q, top_k, topic, language)
+
+        results = self._ann_search(q, top_k, topic, language)
+        if results is not None:
+            return results
+
+        similarities = await self._coalescer.scores(q)
+        return self._rank(similarities, top_k, topic, language)
+
+    def _ann_search(
+        self, q: np.ndarray, top_k: int, topic: str | None, language: str | None
+    ) -> list[tuple[GrammarChunk, float]] | None:
+        """Results from the ANN index, or None when an exact scan is needed"""
+        if self._ann_index is None:
+            return None
+
+        if not topic and not language:
+            scores, ids = self._ann_index.search(q[None, :], top_k)
+            top_idx, top_scores = ids[0][ids[0] >= 0], scores[0][ids[0] >= 0]
+            return [(self.chunks[i], float(score)) for i, score in zip(top_idx, top_scores)]
+
+        # Filtered search: oversample the ANN index and filter post hoc
+        results = self._filtered_ann_search(q, top_k, topic, language)
+        if len(results) == top_k:
+            return results
+        # Too few candidates survived the filters; fall back to an exact scan
+        return None
+
+    def _rank(
+        self,
+        similarities: np.ndarray,
+        top_k: int,
+        topic: str | None,
+        language: str | None,
+    ) -> list[tuple[GrammarChunk, float]]:
+        """Top-k chunks by similarity among those matching the filters"""
+        filtered_indices = self._filtered_indices(topic, language)
+        if filtered_indices is not None:
+            top_idx = filtered_indices[top_k_indices(similarities[filtered_indices], top_k)]
+        else:
+            top_idx = top_k_indices(similarities, top_k)
+
+        return [(self.chunks[i], float(similarities[i])) for i in top_idx.tolist()]
+
+    def _filtered_indices(self, topic: str | None, language: str | None) -> np.ndarray | None:
+        """Rows matching the topic/language filters
+
+        Returns None when there is no filter, or when nothing matches (searches
+        then fall back to unfiltered ranking).
+        """
+        if not topic and not language:
+            return None
+
+        # Vectorized over the column arrays
+        mask = np.ones(len(self.chunks), dtype=bool)
+        if topic:
+            mask &= self._topics == topic
+        if language:
+            mask &= self._languages == language
+        filtered_indices = np.flatnonzero(mask)
+        return filtered_indices if len(filtered_indices) else None
+
+    def _sq_search(
+        self, q: np.ndarray, top_k: int, topic: str | None, language: str | None
+    ) -> list[tuple[GrammarChunk, float]]:
+        """Scan the scalar-quantized index, then re-rank its best candidates in float32
+
+        The top of the ranking (and its scores) match the unquantized search.
+        Only the candidate rows of the float32 matrix are read, so it can stay
+        memory-mapped on disk.
+        """
+        filtered_indices = self._filtered_indices(topic, language)
+        params = None
+        if filtered_indices is not None:
+            params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(filtered_indices))
+
+        n_candidates = min(self._sq_index.ntotal, max(top_k, _RERANK_CANDIDATES))
+        _, ids = self._sq_index.search(q[None, :], n_candidates, params=params)
+        candidates = np.sort(ids[0][ids[0] >= 0])
+
+        scores = self.chunk_embeddings[candidates] @ q
+        best = top_k_indices(scores, top_k)
+        return [(self.chunks[i], float(scores[j])) for i, j in zip(candidates[best], best)]
+
+    def _filtered_ann_search(
+        self, q: np.ndarray, top_k: int, topic: str | None, language: str | None
+    ) -> list[tuple[GrammarChunk, float]]:
+        """Up to top_k filtered hits from the first top_k * _ANN_OVERSAMPLE ANN neighbours"""
+        n_candidates = min(len(self.chunks), top_k * _ANN_OVERSAMPLE)
+        scores, ids = self._ann_index.search(q[None, :], n_candidates)
 
-        # Filter by topic/language if specified
-        filtered_indices = []
-        for i, chunk in enumerate(self.chunks):
+        results = []
+        for i, score in zip(ids[0].tolist(), scores[0].tolist()):
+            if i < 0:
+                continue
+            chunk = self.chunks[i]
             if topic and chunk.topic != topic:
                 continue
             if language and chunk.language != language:
                 continue
-            filtered_indices.append(i)
+            results.append((chunk, score))
+            if len(results) == top_k:
+                break
+        return results
 
-        # Get top-k
-        if filtered_indices:
-            filtered_sims = [(i, similarities[i]) for i in filtered_indices]
-            top_indices = sorted(filtered_sims, key=lambda x: x[1], reverse=True)[:top_k]
-        else:
-            top_indices = [(i, similarities[i]) for i in np.argsort(similarities)[::-1][:top_k]]
+    def format_context(self, chunks: list[GrammarChunk], labeled: bool = True) -> str:
+        """Join chunks into the grammar-reference block of a prompt
 
-        results = [(self.chunks[i], float(score)) for i, score in top_indices]
-        return results
+        Results are cached by chunk content (not id, since caller-supplied chunks
+        may reuse ids), so the same retrieval reused across prompts (e.g.
+        generate_code then explain_rule) is only joined once.
+
+        Args:
+            chunks: Retrieved grammar chunks
+            labeled: Prefix each chunk with "[source sūtra]"
+
+        Returns:
+            Chunk texts separated by blank lines
+        """
+        key = (tuple((chunk.source, chunk.sutra_number, chunk.text) for chunk in chunks), labeled)
+        text = self._context_cache.get(key)
+        if text is None:
+            if labeled:
+                text = "\n\n".join(
+                    f"[{chunk.source} {chunk.sutra_number or ''}]\n{chunk.text}" for chunk in chunks
+                )
+            else:
+                text = "\n\n".join(chunk.text for chunk in chunks)
+            self._context_cache[key] = text
+            if len(self._context_cache) > _CONTEXT_CACHE_SIZE:
+                self._context_cache.popitem(last=False)
+        return text
 
     def generate_code(
         self,
@@ -310,30 +1194,23 @@ class GrammarRAG:
             context_chunks = [chunk for chunk, _ in results]
 
         # Build context from chunks
-        context_text = "\n\n".join(
-            [
-                f"[{chunk.source} {chunk.sutra_number or ''}]\n{chunk.text}"
-                for chunk in context_chunks
-            ]
-        )
+        context_text = self.format_context(context_chunks)
 
-        prompt = f"""You are a Sanskrit NLP expert. Based on these Pāṇinian grammar rules, generate {language} code to implement the requested functionality.
+        # Per-call content goes last, after the cacheable system prompt
+        messages = [
+            {"role": "system", "content": _CODE_SYSTEM_PROMPT_V1},
+            {
+                "role": "user",
+                "content": f"""Task: {task_description}
+Programming language: {language}
 
 Grammar References:
 {context_text}
 
-Task: {task_description}
-
-Generate clean, well-commented {language} code. Include:
-1. Function signature with types
-2. Implementation logic
-3. Comments explaining the grammar rule
-4. Example usage in comments
-
 {language.upper()} CODE:
-"""
-
-        messages = [{"role": "user", "content": prompt}]
+""",
+            },
+        ]
         return self.llm.complete(messages, temperature=0.3)
 
     def explain_rule(
@@ -357,26 +1234,34 @@ Generate clean, well-commented {language} code. Include:
                 return f"Sūtra {sutra_number} not found in loaded texts."
             context_chunks = matching_chunks[:3]
         elif query:
+            query_vec = None
+            if self.semantic_cache is not None:
+                query_vec = self._embed_query(query)
+                cached = self.semantic_cache.get(query_vec, "explanation")
+                if cached is not None:
+                    return cached
+
             results = self.query(query, top_k=3)
             context_chunks = [chunk for chunk, _ in results]
         else:
             raise ValueError("Provide either sutra_number or query")
 
-        context_text = "\n\n".join([chunk.text for chunk in context_chunks])
+        context_text = self.format_context(context_chunks, labeled=False)
 
-        prompt = f"""Explain this Pāṇinian grammar rule in simple, clear English.
-
-Grammar Text:
+        question = f"Question: {query}\n\n" if query and not sutra_number else ""
+        messages = [
+            {"role": "system", "content": _EXPLAIN_SYSTEM_PROMPT_V1},
+            {
+                "role": "user",
+                "content": f"""{question}Grammar Text:
 {context_text}
 
-Provide:
-1. What the rule says
-2. When it applies
-3. A simple example
-4. Common mistakes
-
 EXPLANATION:
-"""
+""",
+            },
+        ]
+        explanation = self.llm.complete(messages, temperature=0.5)
 
-        messages = [{"role": "user", "content": prompt}]
-        return self.llm.complete(messages, temperature=0.5)
+        if not sutra_number and self.semantic_cache is not None:
+            self.semantic_cache.put(query_vec, "explanation", explanation)
+        return explanation
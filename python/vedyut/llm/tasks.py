@@ -1,8 +1,43 @@
 """Sanskrit-specific LLM tasks using RAG"""
 
-from .client import LLMClient
+from .client import LLMClient, _get_client
 from .rag import GrammarRAG
 
+# Stable system prompts come first (and never embed per-call values) so providers
+# with prefix caching can reuse them; bump the version suffix when editing.
+_IMPLEMENTATION_SYSTEM_PROMPT_V1 = """You are a Sanskrit NLP expert implementing Pāṇinian grammar rules in code.
+
+Generate clean, production-ready code in the requested programming language with:
+1. Clear function signature with type annotations
+2. Implementation following the grammar references provided
+3. Detailed comments explaining each step and referencing sūtras
+
+⚠️ IMPORTANT:
+- Be precise with grammar rules
+- Handle edge cases
+- Note any ambiguities or limitations
+"""
+
+_TEST_CASES_SYSTEM_PROMPT_V2 = """You generate diverse test cases for Sanskrit NLP functions.
+
+For each test case, provide:
+1. Input (Sanskrit text or word)
+2. Expected output
+3. Brief description of what it tests
+
+Return all requested test cases in one JSON object:
+{
+  "test_cases": [
+    {
+      "input": "...",
+      "expected": "...",
+      "description": "..."
+    },
+    ...
+  ]
+}
+"""
+
 
 def disambiguate_segmentation(
     text: str,
@@ -31,7 +66,7 @@ def disambiguate_segmentation(
         >>> print(candidates[best_idx])
     """
     if llm is None:
-        llm = LLMClient()
+        llm = _get_client()
 
     # Build context from sandhi rules if RAG available
     context = ""
@@ -42,7 +77,7 @@ def disambiguate_segmentation(
                 [f"- {chunk.text[:200]}..." for chunk, _ in results]
             )
 
-    candidates_text = "\n".join([f"{i + 1}. {' + '.join(seg)}" for i, seg in enumerate(candidates)])
+    candidates_text = "\n".join(f"{i + 1}. {' + '.join(seg)}" for i, seg in enumerate(candidates))
 
     prompt = f"""You are a Sanskrit grammar expert. Given a Sanskrit text and multiple possible segmentations, choose the most grammatically correct and semantically meaningful one.
 
@@ -82,7 +117,7 @@ def translate_sanskrit(
         Translation (and optional explanation)
     """
     if llm is None:
-        llm = LLMClient()
+        llm = _get_client()
 
     if with_explanation:
         prompt = f"""Translate this Sanskrit text to {target_lang} with word-by-word explanation:
@@ -124,11 +159,11 @@ def explain_grammar(
         Beginner-friendly explanation
     """
     if llm is None:
-        llm = LLMClient()
+        llm = _get_client()
 
     analysis_text = ""
     if analysis:
-        analysis_text = "\n".join([f"- {k}: {v}" for k, v in analysis.items()])
+        analysis_text = "\n".join(f"- {k}: {v}" for k, v in analysis.items())
 
     # Get relevant grammar rules if RAG available
     context = ""
@@ -192,36 +227,28 @@ def suggest_implementation(
     if not context_chunks:
         return f"# No relevant grammar rules found for: {rule_description}"
 
-    context_text = "\n\n".join(
-        [f"[{chunk.source} {chunk.sutra_number or ''}]\n{chunk.text}" for chunk in context_chunks]
-    )
+    context_text = rag.format_context(context_chunks)
 
-    test_instruction = ""
-    if include_tests:
-        test_instruction = "\n4. Test cases with examples"
+    test_instruction = "\nAlso include test cases with examples." if include_tests else ""
 
-    prompt = f"""You are a Sanskrit NLP expert implementing Pāṇinian grammar rules in code.
+    # Per-call content goes last, after the cacheable system prompt
+    messages = [
+        {"role": "system", "content": _IMPLEMENTATION_SYSTEM_PROMPT_V1},
+        {
+            "role": "user",
+            "content": f"""Task: {rule_description}
+Programming language: {language}{test_instruction}
 
 Grammar References:
 {context_text}
 
-Task: {rule_description}
-
-Generate clean, production-ready {language} code with:
-1. Clear function signature with type annotations
-2. Implementation following the grammar rules above
-3. Detailed comments explaining each step and referencing sūtras{test_instruction}
-
-⚠️ IMPORTANT:
-- Be precise with grammar rules
-- Handle edge cases
-- Note any ambiguities or limitations
-
 {language.upper()} CODE:
-"""
+""",
+        },
+    ]
 
     llm = rag.llm
-    return llm.complete([{"role": "user", "content": prompt}], temperature=0.3, max_tokens=2000)
+    return llm.complete(messages, temperature=0.3, max_tokens=2000)
 
 
 def generate_test_cases(
@@ -242,7 +269,7 @@ def generate_test_cases(
         List of {"input": "...", "expected": "...", "description": "..."} dicts
     """
     if llm is None:
-        llm = LLMClient()
+        llm = _get_client()
 
     # Get grammar context if available
     context = ""
@@ -253,31 +280,22 @@ def generate_test_cases(
                 [f"{chunk.text[:200]}..." for chunk, _ in results]
             )
 
-    prompt = f"""Generate {num_cases} diverse test cases for this Sanskrit NLP function:
+    messages = [
+        {"role": "system", "content": _TEST_CASES_SYSTEM_PROMPT_V2},
+        {
+            "role": "user",
+            "content": f"""Generate {num_cases} test cases for this function:
 
 Function: {function_description}
 {context}
 
-For each test case, provide:
-1. Input (Sanskrit text or word)
-2. Expected output
-3. Brief description of what it tests
-
-Return as JSON array:
-[
-  {{
-    "input": "...",
-    "expected": "...",
-    "description": "..."
-  }},
-  ...
-]
-
 JSON:
-"""
+""",
+        },
+    ]
 
     try:
-        result = llm.complete_with_json([{"role": "user", "content": prompt}])
+        result = llm.complete_with_json(messages)
         if isinstance(result, dict) and "test_cases" in result:
             return result["test_cases"]
         elif isinstance(result, list):
@@ -316,7 +334,7 @@ def validate_rule_implementation(
     """
     # Retrieve grammar rules
     results = rag.query(rule_description, top_k=2)
-    context_text = "\n\n".join([chunk.text for chunk, _ in results])
+    context_text = rag.format_context([chunk for chunk, _ in results], labeled=False)
 
     prompt = f"""Review this {language} code implementing a Pāṇinian grammar rule.
 
@@ -28,8 +28,7 @@ pub fn sanskritify(
 
     // Step 1: Vocabulary transformation (colloquial → formal/tatsama)
     if options.use_tatsama || options.replace_colloquial {
-        let vocab_transformer = VocabularyTransformer::new();
-        refined = vocab_transformer.transform(&refined, &options)?;
+        refined = VocabularyTransformer::shared().transform(&refined, &options)?;
     }
 
     // Step 2: Grammar pattern application
@@ -2,7 +2,9 @@
 
 use crate::llm_fallback::OriginDetector;
 use crate::{RefinementLevel, SanskritifyError, SanskritifyOptions};
+use aho_corasick::{AhoCorasick, AhoCorasickBuilder, MatchKind};
 use rustc_hash::FxHashMap;
+use std::sync::OnceLock;
 
 /// Transforms vocabulary to use more Sanskrit-like words
 pub struct VocabularyTransformer {
@@ -12,6 +14,10 @@ pub struct VocabularyTransformer {
     foreign_mappings: FxHashMap<String, Vec<String>>,
     /// Origin detector for foreign words
     origin_detector: OriginDetector,
+    /// Automaton over all mapping keys (ASCII case-insensitive, leftmost-longest)
+    automaton: AhoCorasick,
+    /// Key and whether it is a foreign mapping, indexed by automaton pattern ID
+    patterns: Vec<(String, bool)>,
 }
 
 impl VocabularyTransformer {
@@ -163,55 +169,100 @@ impl VocabularyTransformer {
             vec!["प्रयोग".to_string(), "उपयोग".to_string()],
         );
 
+        let patterns: Vec<(String, bool)> = mappings
+            .keys()
+            .map(|key| (key.clone(), false))
+            .chain(foreign_mappings.keys().map(|key| (key.clone(), true)))
+            .collect();
+        let automaton = AhoCorasickBuilder::new()
+            .ascii_case_insensitive(true)
+            .match_kind(MatchKind::LeftmostLongest)
+            .build(patterns.iter().map(|(key, _)| key))
+            .expect("vocabulary automaton should build");
+
         Self {
             mappings,
             foreign_mappings,
             origin_detector: OriginDetector::new(),
+            automaton,
+            patterns,
         }
     }
 
+    /// Shared transformer, built once per process
+    pub fn shared() -> &'static Self {
+        static TRANSFORMER: OnceLock<VocabularyTransformer> = OnceLock::new();
+        TRANSFORMER.get_or_init(Self::new)
+    }
+
     /// Transform text vocabulary
+    ///
+    /// All dictionary words are found in a single Aho-Corasick scan; only
+    /// matches covering a whole whitespace-separated word are replaced.
     pub fn transform(
         &self,
         text: &str,
         options: &SanskritifyOptions,
     ) -> Result<String, SanskritifyError> {
-        let mut result = text.to_string();
-        let words: Vec<&str> = text.split_whitespace().collect();
-
-        // Process each word
-        for word in words {
-            let word_lower = word.to_lowercase();
-
-            // First, check if it's a known foreign word and should be replaced
-            if options.replace_foreign_words && self.origin_detector.is_foreign_origin(&word_lower)
-            {
-                if let Some(sanskrit_options) = self.foreign_mappings.get(&word_lower) {
-                    let replacement = self.select_replacement(sanskrit_options, options.level);
-                    result = result.replace(word, replacement);
-                    continue;
-                } else if options.enable_llm_fallback {
-                    // Word is foreign but not in vocabulary - would use LLM fallback
-                    // For now, mark it for LLM processing
-                    // In production, this would call the LLM API
-                    result = result.replace(
-                        word,
-                        &format!("[LLM_NEEDED: {}]", word), // Placeholder
-                    );
+        let mut result = String::with_capacity(text.len() * 2);
+        let mut last = 0;
+
+        for m in self.automaton.find_iter(text) {
+            if !is_word_boundary(text, m.start(), m.end()) {
+                continue;
+            }
+
+            let (key, foreign) = &self.patterns[m.pattern().as_usize()];
+            let replacement = if *foreign {
+                // Known foreign word: replace only if requested
+                if !options.replace_foreign_words || !self.origin_detector.is_foreign_origin(key) {
                     continue;
                 }
-            }
+                self.select_replacement(&self.foreign_mappings[key], options.level)
+            } else {
+                // Regular vocabulary transformation
+                self.select_replacement(&self.mappings[key], options.level)
+            };
 
-            // Regular vocabulary transformation
-            if let Some(tatsama_options) = self.mappings.get(&word_lower) {
-                let replacement = self.select_replacement(tatsama_options, options.level);
-                result = result.replace(word, replacement);
-            }
+            self.push_unmatched(&mut result, &text[last..m.start()], options);
+            result.push_str(replacement);
+            last = m.end();
         }
+        self.push_unmatched(&mut result, &text[last..], options);
 
         Ok(result)
     }
 
+    /// Copy text without dictionary matches, marking foreign words for LLM fallback
+    fn push_unmatched(&self, result: &mut String, text: &str, options: &SanskritifyOptions) {
+        if !(options.replace_foreign_words && options.enable_llm_fallback) {
+            result.push_str(text);
+            return;
+        }
+
+        let mut rest = text;
+        while let Some(start) = rest.find(|c: char| !c.is_whitespace()) {
+            let end = rest[start..]
+                .find(char::is_whitespace)
+                .map_or(rest.len(), |i| start + i);
+            let word = &rest[start..end];
+            result.push_str(&rest[..start]);
+
+            if self.origin_detector.is_foreign_origin(word) {
+                // Word is foreign but not in vocabulary - would use LLM fallback
+                // For now, mark it for LLM processing
+                // In production, this would call the LLM API
+                result.push_str("[LLM_NEEDED: ");
+                result.push_str(word);
+                result.push(']');
+            } else {
+                result.push_str(word);
+            }
+            rest = &rest[end..];
+        }
+        result.push_str(rest);
+    }
+
     /// Select appropriate replacement based on refinement level
     fn select_replacement<'a>(&self, options: &'a [String], level: RefinementLevel) -> &'a str {
         if options.is_empty() {
@@ -240,6 +291,13 @@ impl VocabularyTransformer {
     }
 }
 
+/// Whether `text[start..end]` is a whole whitespace-separated word
+fn is_word_boundary(text: &str, start: usize, end: usize) -> bool {
+    let before = text[..start].chars().next_back();
+    let after = text[end..].chars().next();
+    before.is_none_or(char::is_whitespace) && after.is_none_or(char::is_whitespace)
+}
+
 impl Default for VocabularyTransformer {
     fn default() -> Self {
         Self::new()
@@ -282,4 +340,16 @@ mod tests {
         assert!(!result_light.is_empty());
         assert!(!result_high.is_empty());
     }
+
+    #[test]
+    fn test_only_whole_words_replaced() {
+        let transformer = VocabularyTransformer::new();
+        let options = SanskritifyOptions::light();
+
+        // "hi" inside "this" and "sun" inside "sunday" must be left alone
+        let result = transformer
+            .transform("this Sunday, hi  Friend", &options)
+            .unwrap();
+        assert_eq!(result, "this Sunday, नमस्कार  मित्र");
+    }
 }
@@ -1,6 +1,8 @@
 """Tests for FastAPI endpoints"""
 
+import pytest
 from fastapi.testclient import TestClient
+from vedyut.api import main
 from vedyut.api.main import app
 
 client = TestClient(app)
@@ -77,3 +79,57 @@ def test_metrics():
     data = response.json()
     assert "requests_total" in data
     assert "avg_latency_ms" in data
+
+
+def test_transliterate_unknown_scheme():
+    """Unknown schemes are rejected as bad requests"""
+    payload = {"text": "rāma", "from_scheme": "klingon", "to_scheme": "devanagari"}
+    response = client.post("/v1/transliterate", json=payload)
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize(
+    "name, script",
+    [
+        ("hk", "harvard-kyoto"),
+        ("iso", "iso15919"),
+        ("DEVA", "devanagari"),
+        ("bangla", "bengali"),
+        ("oriya", "odia"),
+        ("punjabi", "gurmukhi"),
+        ("sinhalese", "sinhala"),
+    ],
+)
+def test_parse_script_accepts_core_aliases(name, script):
+    """Short names accepted by the core's scheme parser resolve to the same Script"""
+    assert main._parse_script(name).value == script
+
+    payload = {"text": "rāma", "from_scheme": name, "to_scheme": "devanagari"}
+    assert client.post("/v1/transliterate", json=payload).status_code == 200
+
+
+def test_response_cache_hit():
+    """Repeating an identical request is served from the response cache"""
+    payload = {"dhatu": "गम्", "lakara": "lot", "purusha": "madhyama", "vacana": "eka"}
+    first = client.post("/v1/generate", json=payload).json()
+    hits_before = client.get("/metrics").json()["cache_hits"]
+
+    second = client.post("/v1/generate", json=payload).json()
+    assert second["forms"] == first["forms"]
+    assert client.get("/metrics").json()["cache_hits"] == hits_before + 1
+
+
+def test_sanskritify_stream(monkeypatch):
+    """Streaming endpoint forwards LLM tokens as server-sent events"""
+
+    class FakeLLM:
+        async def astream(self, messages, **kwargs):
+            for token in ["नमस्ते ", "मित्र"]:
+                yield token
+
+    monkeypatch.setattr(main, "_get_llm_client", lambda: FakeLLM())
+    payload = {"text": "hello friend", "script": "devanagari"}
+    response = client.post("/v1/sanskritify/stream", json=payload)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text == "data: नमस्ते \n\ndata: मित्र\n\ndata: [DONE]\n\n"
@@ -0,0 +1,827 @@
+"""Tests for LLM client and grammar RAG (no network: provider calls are faked)"""
+
+import asyncio
+import dataclasses
+import hashlib
+import json
+import os
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+pytest.importorskip("litellm")
+
+from vedyut.llm import client as client_module  # noqa: E402
+from vedyut.llm import rag as rag_module  # noqa: E402
+from vedyut.llm.cache import EmbeddingCache, SemanticCache  # noqa: E402
+from vedyut.llm.client import LLMClient  # noqa: E402
+from vedyut.llm.rag import GrammarRAG  # noqa: E402
+
+PARAGRAPHS = [
+    "1.1.1 vṛddhir ādaic\nThe vowels ā, ai, au are called vṛddhi.",
+    "1.1.2 adeṅ guṇaḥ\nThe vowels a, e, o are called guṇa.",
+    "6.1.87 ād guṇaḥ\nSandhi: a or ā followed by i becomes e.",
+    "3.4.78 tiptasjhi...\nPresent tense (laṭ lakara) verb endings.",
+]
+
+# English notes (a second source) so filters keep a strict subset of the corpus
+NOTES = [
+    "Sandhi joins the final and initial sounds of adjacent words.",
+    "A samasa compound drops the case endings of its members.",
+]
+
+
+class FakeEmbedding:
+    """Stand-in for litellm.embedding that records every request"""
+
+    def __init__(self, dim: int = 8):
+        self.dim = dim
+        self.calls: list[list[str]] = []
+
+    def vector(self, text: str) -> list[float]:
+        # Stable across runs (unlike hash()) and fine-grained enough that scores never tie
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        return [float(byte) + 1.0 for byte in digest[: self.dim]]
+
+    def __call__(self, model: str, input: list[str]):
+        self.calls.append(list(input))
+
+        class Response:
+            data = [{"embedding": self.vector(text)} for text in input]
+
+        return Response()
+
+
+@pytest.fixture
+def fake_embedding(monkeypatch):
+    fake = FakeEmbedding()
+    monkeypatch.setattr(client_module, "embedding", fake)
+
+    async def fake_aembedding(model: str, input: list[str]):
+        return fake(model, input)
+
+    monkeypatch.setattr(client_module, "aembedding", fake_aembedding)
+    return fake
+
+
+@pytest.fixture
+def llm(tmp_path, monkeypatch, fake_embedding):
+    monkeypatch.setenv("VEDYUT_EMBED_CACHE", str(tmp_path / "embeds"))
+    return LLMClient(model="fake", embedding_model="fake-embed")
+
+
+@pytest.fixture
+def rag(tmp_path, llm):
+    data_dir = tmp_path / "grammar"
+    data_dir.mkdir()
+    (data_dir / "ashtadhyayi.txt").write_text("\n\n".join(PARAGRAPHS), encoding="utf-8")
+    rag = GrammarRAG(data_dir=str(data_dir), llm_client=llm)
+    rag.load_texts()
+    rag.build_index()
+    return rag
+
+
+@pytest.fixture
+def mixed_rag(tmp_path, llm):
+    data_dir = tmp_path / "mixed"
+    data_dir.mkdir()
+    (data_dir / "ashtadhyayi.txt").write_text("\n\n".join(PARAGRAPHS), encoding="utf-8")
+    (data_dir / "kale_grammar.txt").write_text("\n\n".join(NOTES), encoding="utf-8")
+    rag = GrammarRAG(data_dir=str(data_dir), llm_client=llm)
+    rag.load_texts()
+    rag.build_index()
+    return rag
+
+
+def test_embed_cache_only_sends_misses(llm, fake_embedding):
+    """Second call with overlapping texts only embeds the new ones"""
+    first = llm.embed(["sandhi", "lakara"])
+    second = llm.embed(["lakara", "dhatu", "sandhi"])
+
+    assert fake_embedding.calls == [["sandhi", "lakara"], ["dhatu"]]
+    assert second[0].tolist() == first[1].tolist()
+    assert second[2].tolist() == first[0].tolist()
+
+
+def test_embed_cache_persists_across_clients(llm, fake_embedding):
+    """A fresh client reuses vectors written by an earlier one"""
+    llm.embed(["vṛddhi"])
+    other = LLMClient(model="fake", embedding_model="fake-embed")
+    vec = other.embed_single("vṛddhi")
+
+    assert fake_embedding.calls == [["vṛddhi"]]
+    assert vec.tolist() == fake_embedding.vector("vṛddhi")
+
+
+def test_embed_batches_preserve_order(llm, fake_embedding):
+    """Misses are split into batches and reassembled in input order"""
+    texts = [f"sūtra {i}" for i in range(10)]
+    vectors = llm.embed(texts, batch_size=3, max_parallel=4)
+
+    assert sorted(len(call) for call in fake_embedding.calls) == [1, 3, 3, 3]
+    assert [v.tolist() for v in vectors] == [fake_embedding.vector(t) for t in texts]
+
+
+async def test_aembed_shares_cache_with_embed(llm, fake_embedding):
+    """Async embedding reads and writes the same cache as the sync path"""
+    llm.embed(["guṇa"])
+    vectors = await llm.aembed(["guṇa", "vṛddhi"], batch_size=1)
+
+    assert fake_embedding.calls == [["guṇa"], ["vṛddhi"]]
+    assert [v.tolist() for v in vectors] == [
+        fake_embedding.vector("guṇa"),
+        fake_embedding.vector("vṛddhi"),
+    ]
+
+
+def test_embed_array_shape(llm):
+    """embed_array returns a float32 matrix, optionally L2-normalized"""
+    arr = llm.embed_array(["a", "b", "c"], normalize=True)
+
+    assert arr.shape == (3, 8)
+    assert arr.dtype.name == "float32"
+    assert abs(float((arr[0] ** 2).sum()) - 1.0) < 1e-5
+
+
+def test_rag_query_finds_exact_chunk(rag):
+    """A chunk's own text is its nearest neighbour"""
+    results = rag.query(PARAGRAPHS[2], top_k=2)
+
+    assert results[0][0].sutra_number == "6.1.87"
+    assert results[0][1] == pytest.approx(1.0, abs=1e-5)
+    assert len(results) == 2
+
+
+def test_rag_index_round_trip(rag, llm):
+    """A saved index loads back with the same chunks and scores"""
+    reloaded = GrammarRAG(data_dir=str(rag.data_dir), llm_client=llm)
+    reloaded.build_index()
+
+    assert [c.id for c in reloaded.chunks] == [c.id for c in rag.chunks]
+    expected = [(c.id, round(s, 5)) for c, s in rag.query(PARAGRAPHS[0], top_k=3)]
+    actual = [(c.id, round(s, 5)) for c, s in reloaded.query(PARAGRAPHS[0], top_k=3)]
+    assert actual == expected
+
+
+def test_int8_cache_round_trip(tmp_path):
+    """int8 cache storage is lossy but close to the original vector"""
+    cache = EmbeddingCache(cache_dir=str(tmp_path), dtype="int8")
+    vec = np.linspace(-1.0, 1.0, 64, dtype=np.float32)
+    cache.set_many([b"k"], [vec])
+
+    restored = cache.get_many([b"k", b"missing"])
+    assert restored[1] is None
+    assert np.allclose(restored[0], vec, atol=1.0 / 127)
+
+
+@pytest.mark.parametrize("quantize", ["int8", "float16"])
+def test_rag_quantized_search_matches_float32(rag, llm, quantize):
+    """Quantized search returns the same ranking as float32 search"""
+    if not rag_module.FAISS_AVAILABLE:
+        pytest.skip("faiss not installed")
+
+    quantized = GrammarRAG(data_dir=str(rag.data_dir), llm_client=llm, quantize=quantize)
+    quantized.build_index()
+
+    expected = [(c.id, round(s, 5)) for c, s in rag.query(PARAGRAPHS[3], top_k=3)]
+    actual = [(c.id, round(s, 5)) for c, s in quantized.query(PARAGRAPHS[3], top_k=3)]
+    assert actual == expected
+
+
+@pytest.mark.parametrize("quantize", ["int8", "float16"])
+@pytest.mark.parametrize(
+    "filters",
+    [{}, {"language": "english"}, {"topic": "sandhi"}, {"topic": "sandhi", "language": "sanskrit"}],
+)
+def test_rag_quantized_search_uses_persisted_codes(mixed_rag, llm, quantize, filters):
+    """Quantized search uses a saved FAISS SQ index and leaves float32 rows on disk"""
+    if not rag_module.FAISS_AVAILABLE:
+        pytest.skip("faiss not installed")
+
+    rag = mixed_rag
+    quantized = GrammarRAG(data_dir=str(rag.data_dir), llm_client=llm, quantize=quantize)
+    quantized.load_texts()
+    quantized.build_index(force_rebuild=True)
+    assert quantized.quantized_index_file.exists()
+    assert isinstance(quantized.chunk_embeddings.base, np.memmap)
+
+    reloaded = GrammarRAG(data_dir=str(rag.data_dir), llm_client=llm, quantize=quantize)
+    reloaded.build_index()
+    matching = {
+        c.id
+        for c in rag.chunks
+        if c.topic == filters.get("topic", c.topic)
+        and c.language == filters.get("language", c.language)
+    }
+    if filters:
+        assert 0 < len(matching) < len(rag.chunks)
+
+    expected = [(c.id, round(s, 5)) for c, s in rag.query("guṇa", top_k=3, **filters)]
+    actual = [(c.id, round(s, 5)) for c, s in reloaded.query("guṇa", top_k=3, **filters)]
+    assert actual
+    assert {chunk_id for chunk_id, _ in actual} <= matching
+    assert actual == expected
+
+
+def test_rebuild_removes_stale_ann_index(tmp_path, llm):
+    """A rebuild that skips the HNSW step does not leave the old .faiss behind"""
+    if not rag_module.FAISS_AVAILABLE:
+        pytest.skip("faiss not installed")
+
+    data_dir = tmp_path / "grammar"
+    data_dir.mkdir()
+    corpus = data_dir / "ashtadhyayi.txt"
+    corpus.write_text("\n\n".join(PARAGRAPHS), encoding="utf-8")
+    rag = GrammarRAG(data_dir=str(data_dir), llm_client=llm)
+    rag.load_texts()
+    rag.build_index()
+    assert rag.ann_index_file.exists()
+
+    corpus.write_text("\n\n".join(PARAGRAPHS[:3] + ["epsilon five"]), encoding="utf-8")
+    quantized = GrammarRAG(data_dir=str(data_dir), llm_client=llm, quantize="int8")
+    quantized.load_texts()
+    quantized.build_index(force_rebuild=True)
+    assert not rag.ann_index_file.exists()
+
+    reloaded = GrammarRAG(data_dir=str(data_dir), llm_client=llm)
+    reloaded.build_index()
+    chunk, score = reloaded.query("epsilon five", top_k=1)[0]
+    assert chunk.text == "epsilon five"
+    assert score == pytest.approx(1.0, abs=1e-5)
+
+
+def test_topk_cosine_matches_full_sort():
+    """The top-k kernel agrees with a full argsort"""
+    rng = np.random.default_rng(0)
+    matrix = rng.standard_normal((500, 32)).astype(np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    q = matrix[7].copy()
+
+    idx, scores = rag_module.topk_cosine(matrix, q, 5)
+    expected = np.argsort(-(matrix @ q))[:5]
+
+    assert idx.tolist() == expected.tolist()
+    assert scores[0] == pytest.approx(1.0, abs=1e-5)
+
+
+def test_semantic_cache_matches_near_duplicates():
+    """Vectors above the threshold share an entry; dissimilar ones miss"""
+    cache = SemanticCache(threshold=0.95)
+    base = np.ones(16, dtype=np.float32)
+    near = base.copy()
+    near[0] = 1.1
+    far = -base
+
+    cache.put(base, "answer", "sandhi is euphonic combination")
+    assert cache.get(near, "answer") == "sandhi is euphonic combination"
+    assert cache.get(far, "answer") is None
+    assert cache.get(base, "other-key") is None
+
+
+def test_semantic_cache_finds_best_match_among_entries():
+    """Every cached vector is scanned; the oldest entries are overwritten when full"""
+    rng = np.random.default_rng(0)
+    cache = SemanticCache(threshold=0.95, max_entries=80)
+    vectors = rng.standard_normal((100, 32)).astype(np.float32)
+    for i, vector in enumerate(vectors):
+        cache.put(vector, "answer", i)
+
+    for i in (20, 67, 99):
+        near = vectors[i] + 0.01 * rng.standard_normal(32).astype(np.float32)
+        assert cache.get(near, "answer") == i
+    assert cache.get(vectors[5], "answer") is None
+    assert len(cache) == 80
+
+
+def test_explain_rule_reuses_cached_answer(rag, monkeypatch):
+    """Only with the semantic cache enabled is a repeated query answered from cache"""
+    prompts = []
+
+    def fake_complete(messages, **kwargs):
+        prompts.append(messages)
+        return "explanation"
+
+    monkeypatch.setattr(rag.llm, "complete", fake_complete)
+
+    assert rag.semantic_cache is None
+    rag.explain_rule(query="What is sandhi?")
+    rag.explain_rule(query="What is sandhi?")
+    assert len(prompts) == 2
+
+    rag.semantic_cache = SemanticCache()
+    assert rag.explain_rule(query="What is sandhi?") == "explanation"
+    assert rag.explain_rule(query="What is sandhi?") == "explanation"
+    assert len(prompts) == 3
+
+
+def test_anthropic_system_prompt_marked_cacheable(tmp_path, monkeypatch):
+    """System prompts get cache_control for Claude models only"""
+    monkeypatch.setenv("VEDYUT_EMBED_CACHE", str(tmp_path))
+    messages = [
+        {"role": "system", "content": "stable prefix"},
+        {"role": "user", "content": "question"},
+    ]
+
+    claude = LLMClient(model="claude-3-5-sonnet-20241022")._with_prompt_cache(messages)
+    assert claude[0]["content"][0]["cache_control"] == {"type": "ephemeral"}
+    assert claude[1] == messages[1]
+
+    assert LLMClient(model="gpt-4o")._with_prompt_cache(messages) == messages
+
+
+def test_complete_batch_inline_single_call(llm, monkeypatch):
+    """Inline batching sends one request and splits the JSON answer"""
+    calls = []
+
+    def fake_completion(**kwargs):
+        calls.append(kwargs)
+
+        class Message:
+            content = '{"responses": ["guṇa", "vṛddhi"]}'
+
+        class Choice:
+            message = Message()
+
+        class Response:
+            choices = [Choice()]
+
+        return Response()
+
+    monkeypatch.setattr(client_module, "completion", fake_completion)
+
+    answers = llm.complete_batch(
+        [
+            [{"role": "user", "content": "Name of a, e, o?"}],
+            [{"role": "user", "content": "Name of ā, ai, au?"}],
+        ]
+    )
+
+    assert answers == ["guṇa", "vṛddhi"]
+    assert len(calls) == 1
+    assert calls[0]["response_format"] == {"type": "json_object"}
+
+
+def test_complete_batch_openai_keeps_failed_tasks_as_none(llm, monkeypatch):
+    """Failed Batch API records leave None in their slot instead of losing the batch"""
+
+    def ok(i, content):
+        return {
+            "custom_id": str(i),
+            "response": {
+                "status_code": 200,
+                "body": {"choices": [{"message": {"content": content}}]},
+            },
+            "error": None,
+        }
+
+    files = {
+        "out": [ok(2, "third"), ok(0, "first")],
+        "err": [
+            {
+                "custom_id": "1",
+                "response": None,
+                "error": {"code": "server_error", "message": "boom"},
+            },
+            {"custom_id": "3", "response": {"status_code": 400, "body": {}}, "error": None},
+        ],
+    }
+    uploads = []
+    litellm = client_module.litellm
+    monkeypatch.setattr(
+        litellm,
+        "create_file",
+        lambda file, **kwargs: uploads.append(file[1]) or SimpleNamespace(id="input"),
+    )
+    monkeypatch.setattr(
+        litellm, "create_batch", lambda **kwargs: SimpleNamespace(id="b1", status="in_progress")
+    )
+    monkeypatch.setattr(
+        litellm,
+        "retrieve_batch",
+        lambda **kwargs: SimpleNamespace(
+            id="b1", status="completed", output_file_id="out", error_file_id="err"
+        ),
+    )
+    monkeypatch.setattr(
+        litellm,
+        "file_content",
+        lambda file_id, **kwargs: SimpleNamespace(
+            text="\n".join(json.dumps(record) for record in files[file_id])
+        ),
+    )
+
+    batched = [[{"role": "user", "content": f"task {i}"}] for i in range(4)]
+    responses = llm.complete_batch(batched, provider="openai_batch", poll_interval=0)
+
+    assert responses == ["first", None, "third", None]
+    requests = [json.loads(line) for line in uploads[0].decode("utf-8").splitlines()]
+    assert [r["custom_id"] for r in requests] == ["0", "1", "2", "3"]
+    assert requests[0]["body"]["model"] == "fake"
+
+
+def test_iter_paragraphs_matches_split(tmp_path):
+    """The mmap paragraph scan agrees with str.split on blank lines"""
+    text = "\n\n".join(PARAGRAPHS) + "\n\n\n  \n\nवृद्धिरादैच्\n"
+    path = tmp_path / "corpus.txt"
+    path.write_bytes(text.encode("utf-8"))
+    crlf = tmp_path / "corpus_crlf.txt"
+    crlf.write_bytes(text.replace("\n", "\r\n").encode("utf-8"))
+    (tmp_path / "empty.txt").write_bytes(b"")
+
+    expected = [p.strip() for p in text.split("\n\n") if p.strip()]
+    assert list(rag_module._iter_paragraphs(path)) == expected
+    assert list(rag_module._iter_paragraphs(crlf)) == expected
+    assert list(rag_module._iter_paragraphs(tmp_path / "empty.txt")) == []
+
+
+def test_quick_complete_reuses_client(tmp_path, monkeypatch):
+    """Helpers called without a client share one instance per configuration"""
+    monkeypatch.setenv("VEDYUT_EMBED_CACHE", str(tmp_path))
+    client_module._get_client.cache_clear()
+    monkeypatch.setattr(client_module.LLMClient, "complete", lambda self, messages: "ok")
+
+    assert client_module.quick_complete("a", model="fake") == "ok"
+    assert client_module.quick_complete("b", model="fake") == "ok"
+    assert client_module._get_client.cache_info().currsize == 1
+
+
+def test_embedding_cache_opens_on_first_embed(tmp_path, monkeypatch, fake_embedding):
+    """Completion-only clients never create the cache directory"""
+    cache_dir = tmp_path / "embeds"
+    monkeypatch.setenv("VEDYUT_EMBED_CACHE", str(cache_dir))
+
+    client = LLMClient(model="fake", embedding_model="fake-embed")
+    assert not cache_dir.exists()
+
+    client.embed(["sandhi"])
+    assert cache_dir.exists()
+
+
+def test_http_sessions_are_only_installed_on_request(tmp_path, monkeypatch):
+    """LiteLLM's process-wide sessions are left alone unless a client opts in"""
+    monkeypatch.setenv("VEDYUT_EMBED_CACHE", str(tmp_path))
+    monkeypatch.setattr(client_module.litellm, "client_session", None)
+    monkeypatch.setattr(client_module.litellm, "aclient_session", None)
+
+    LLMClient(model="fake")
+    assert client_module.litellm.client_session is None
+
+    LLMClient(model="fake", pool_connections=True)
+    session = client_module.litellm.client_session
+    assert session is not None
+    assert client_module.litellm.aclient_session is not None
+
+    LLMClient(model="fake", pool_connections=True)
+    assert client_module.litellm.client_session is session
+
+
+def test_embed_dedupes_repeated_texts(llm, fake_embedding):
+    """Repeated texts are sent once and scattered back to every position"""
+    vectors = llm.embed(["guṇa", "vṛddhi", "guṇa", "guṇa"])
+
+    assert fake_embedding.calls == [["guṇa", "vṛddhi"]]
+    assert [v.tolist() for v in vectors] == [
+        fake_embedding.vector(t) for t in ["guṇa", "vṛddhi", "guṇa", "guṇa"]
+    ]
+    assert llm.embed([]) == []
+    assert fake_embedding.calls == [["guṇa", "vṛddhi"]]
+
+
+def test_rag_index_memory_maps_embeddings(rag, llm):
+    """Embeddings live in a raw sidecar file and load memory-mapped"""
+    data = json.loads(rag.index_file.read_text(encoding="utf-8"))
+    assert "embedding" not in data["chunks"][0]
+    assert "text" not in data["chunks"][0]
+    assert data["embeddings"]["shape"] == [len(PARAGRAPHS), 8]
+
+    reloaded = GrammarRAG(data_dir=str(rag.data_dir), llm_client=llm)
+    reloaded.build_index()
+    assert isinstance(reloaded.chunk_embeddings.base, np.memmap)
+    assert not reloaded.chunk_embeddings.flags.writeable
+    assert [c.text for c in reloaded.chunks] == [c.text for c in rag.chunks]
+    assert reloaded.query(PARAGRAPHS[1], top_k=1)[0][0].sutra_number == "1.1.2"
+
+
+def test_rebuild_replaces_index_files_under_readers(rag, llm):
+    """A rebuild swaps in new files, so an existing memory map keeps its old rows"""
+    reader = GrammarRAG(data_dir=str(rag.data_dir), llm_client=llm)
+    reader.build_index()
+    before = reader.chunk_embeddings.copy()
+    old_files = [reader.embeddings_file, reader.texts_file, reader.text_offsets_file]
+
+    (rag.data_dir / "ashtadhyayi.txt").write_text("\n\n".join(PARAGRAPHS[::-1]), encoding="utf-8")
+    writer = GrammarRAG(data_dir=str(rag.data_dir), llm_client=llm)
+    writer.load_texts()
+    writer.build_index(force_rebuild=True)
+
+    assert writer.embeddings_file not in old_files
+    assert not any(path.exists() for path in old_files)
+    np.testing.assert_array_equal(reader.chunk_embeddings, before)
+    assert not list(rag.data_dir.glob(".*.tmp"))
+
+
+def test_load_rejects_index_that_does_not_match_its_embeddings(rag, llm):
+    """A JSON paired with another build's embeddings fails loudly instead of mislabeling rows"""
+    data = json.loads(rag.index_file.read_text(encoding="utf-8"))
+    data["chunks"] = data["chunks"][:-1]
+    rag.index_file.write_text(json.dumps(data), encoding="utf-8")
+
+    with pytest.raises(ValueError, match="force_rebuild"):
+        GrammarRAG(data_dir=str(rag.data_dir), llm_client=llm).build_index()
+
+
+def test_load_rejects_text_offsets_that_do_not_match_chunks(rag, llm):
+    """Missing text offsets raise instead of silently dropping chunks"""
+    np.save(rag.text_offsets_file, np.load(rag.text_offsets_file)[:-1])
+
+    with pytest.raises(ValueError, match="text offsets"):
+        GrammarRAG(data_dir=str(rag.data_dir), llm_client=llm).build_index()
+
+
+def test_saved_index_files_follow_umask(tmp_path, llm):
+    """Index files are as readable as plain writes would make them, not owner-only"""
+    data_dir = tmp_path / "grammar"
+    data_dir.mkdir()
+    (data_dir / "ashtadhyayi.txt").write_text("\n\n".join(PARAGRAPHS), encoding="utf-8")
+    old_umask = os.umask(0o022)
+    try:
+        rag = GrammarRAG(data_dir=str(data_dir), llm_client=llm)
+        rag.load_texts()
+        rag.build_index()
+    finally:
+        os.umask(old_umask)
+
+    for path in (rag.index_file, rag.embeddings_file, rag.texts_file, rag.text_offsets_file):
+        assert path.stat().st_mode & 0o777 == 0o644
+
+
+def test_rag_loads_legacy_json_index(rag, llm):
+    """Version 1.0 indexes with embeddings inlined in the JSON still load"""
+    chunks = []
+    for chunk, row in zip(rag.chunks, rag.chunk_embeddings):
+        record = dataclasses.asdict(chunk)
+        record["embedding"] = row.tolist()
+        chunks.append(record)
+    rag.index_file.write_text(json.dumps({"chunks": chunks, "version": "1.0"}), encoding="utf-8")
+
+    legacy = GrammarRAG(data_dir=str(rag.data_dir), llm_client=llm)
+    legacy.build_index()
+    assert legacy.chunk_embeddings.dtype == np.float32
+    assert legacy.chunk_embeddings.shape == rag.chunk_embeddings.shape
+    assert legacy.query(PARAGRAPHS[2], top_k=1)[0][0].sutra_number == "6.1.87"
+
+
+def test_warm_queries_are_embedded_in_one_request(tmp_path, llm, fake_embedding):
+    """build_index warms warm_queries.txt so later queries make no provider call"""
+    data_dir = tmp_path / "warm"
+    data_dir.mkdir()
+    (data_dir / "ashtadhyayi.txt").write_text("\n\n".join(PARAGRAPHS), encoding="utf-8")
+    (data_dir / "warm_queries.txt").write_text(
+        "# common demo questions\nWhat is sandhi?\n\nHow to form present tense verbs?\n",
+        encoding="utf-8",
+    )
+    rag = GrammarRAG(data_dir=str(data_dir), llm_client=llm)
+    rag.load_texts()
+    rag.build_index()
+
+    assert fake_embedding.calls[-1] == ["What is sandhi?", "How to form present tense verbs?"]
+    calls = len(fake_embedding.calls)
+    rag.query("What is sandhi?")
+    assert len(fake_embedding.calls) == calls
+
+
+def test_warm_searches_with_the_batched_vectors(rag, monkeypatch):
+    """warm reuses the vectors from its one embed call instead of embedding each query again"""
+
+    def embed_single(text):
+        raise AssertionError(f"{text!r} embedded again")
+
+    monkeypatch.setattr(rag.llm, "embed_single", embed_single)
+    assert rag.warm(["What is sandhi?", "verb tense"], top_k=2) == 2
+    assert len(rag.query("What is sandhi?", top_k=2)) == 2
+    assert len(rag.query("verb tense", top_k=2)) == 2
+
+
+def test_embedding_cache_shared_between_connections(tmp_path):
+    """Caches opened on the same directory (e.g. by two workers) see each other's writes"""
+    writer = EmbeddingCache(cache_dir=str(tmp_path))
+    reader = EmbeddingCache(cache_dir=str(tmp_path))
+    vec = np.arange(8, dtype=np.float32)
+
+    writer.set_many([b"k"], [vec])
+    assert reader.get_many([b"k"])[0].tolist() == vec.tolist()
+    assert reader._conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_rag_filtered_query_scores_are_cosines(rag):
+    """Filtered search scores match cosine similarity against the raw embeddings"""
+    query_vec = np.asarray(rag.llm.embed_single(PARAGRAPHS[0]), dtype=np.float32)
+    raw = rag.llm.embed_array([c.text for c in rag.chunks])
+    expected = raw @ query_vec / (np.linalg.norm(raw, axis=1) * np.linalg.norm(query_vec))
+
+    results = rag.query(PARAGRAPHS[0], top_k=len(PARAGRAPHS), language="sanskrit")
+    scores = {c.id: s for c, s in results}
+    for chunk, score in zip(rag.chunks, expected):
+        assert scores[chunk.id] == pytest.approx(float(score), abs=1e-5)
+
+
+def test_build_index_concurrent_batches_keep_order(tmp_path, llm, fake_embedding):
+    """Concurrently embedded batches are reassembled in chunk order"""
+    data_dir = tmp_path / "large"
+    data_dir.mkdir()
+    paragraphs = [f"{i // 100}.{i % 100}.1 sūtra {i}" for i in range(250)]
+    (data_dir / "ashtadhyayi.txt").write_text("\n\n".join(paragraphs), encoding="utf-8")
+    rag = GrammarRAG(data_dir=str(data_dir), llm_client=llm)
+    rag.load_texts()
+    rag.build_index(concurrency=3)
+
+    assert sorted(len(call) for call in fake_embedding.calls) == [50, 100, 100]
+    expected = np.array([fake_embedding.vector(c.text) for c in rag.chunks], dtype=np.float32)
+    expected /= np.linalg.norm(expected, axis=1, keepdims=True)
+    assert np.allclose(rag.chunk_embeddings, expected, atol=1e-6)
+
+
+async def test_query_with_zero_top_k_returns_nothing(rag):
+    """top_k <= 0 returns no results on every search path instead of reaching faiss"""
+    assert rag.query("sandhi", top_k=0) == []
+    assert rag.query("sandhi", top_k=0, topic="sandhi") == []
+    assert await rag.aquery("sandhi", top_k=0) == []
+
+
+def test_filtered_ann_search_matches_exact(mixed_rag):
+    """Filtered queries through the ANN index agree with the exact scan"""
+    rag = mixed_rag
+    if rag._ann_index is None:
+        pytest.skip("faiss not installed")
+
+    query_vec = rag._embed_query("guṇa")
+    ann = [(c.id, round(s, 5)) for c, s in rag._search(query_vec, 3, "sandhi", None)]
+    rag._ann_index = None
+    exact = [(c.id, round(s, 5)) for c, s in rag._search(query_vec, 3, "sandhi", None)]
+
+    excluded = {c.id for c in rag.chunks if c.topic != "sandhi"}
+    assert excluded
+    assert ann
+    assert not excluded & {chunk_id for chunk_id, _ in ann}
+    assert ann == exact
+
+
+def test_dot_scores_simsimd_path_matches_blas(monkeypatch):
+    """The SimSIMD branch returns the same row scores as BLAS matvec"""
+
+    class FakeSimSIMD:
+        @staticmethod
+        def cdist(a, b, metric):
+            assert metric == "dot"
+            return a @ b.T
+
+    rng = np.random.default_rng(1)
+    matrix = rng.standard_normal((20, 16)).astype(np.float32)
+    q = rng.standard_normal(16).astype(np.float32)
+    monkeypatch.setattr(rag_module, "simsimd", FakeSimSIMD, raising=False)
+    monkeypatch.setattr(rag_module, "SIMSIMD_AVAILABLE", True)
+
+    scores = rag_module.dot_scores(matrix, q)
+    assert scores.shape == (20,)
+    assert np.allclose(scores, matrix @ q, atol=1e-5)
+
+
+def test_infer_topic_keeps_keyword_priority(rag):
+    """Topics follow keyword priority, not position, and ignore case"""
+    assert rag._infer_topic("Verb endings after SANDHI") == "sandhi"
+    assert rag._infer_topic("the rootense overlap") == "lakara"
+    assert rag._infer_topic("समास compound") == "samasa"
+    assert rag._infer_topic("no keywords here") is None
+
+
+def test_infer_topic_ignores_non_ascii_case_variants(rag):
+    """OCR artifacts like the long s (ſ) neither crash nor match ASCII keywords"""
+    assert rag._infer_topic("ſandhi") is None
+    assert rag._infer_topic("CAſE and धातु") == "dhatu"
+    assert rag._infer_topic("CASE") == "vibhakti"
+
+
+def test_grammar_chunk_has_no_instance_dict(rag):
+    """Chunks use slots and carry no per-chunk embedding copy"""
+    chunk = rag.chunks[0]
+    assert not hasattr(chunk, "__dict__")
+    assert not hasattr(chunk, "embedding")
+
+
+def test_rag_topic_filter(rag):
+    """Topic filters keep only matching chunks, best first"""
+    rag._ann_index = None
+    results = rag.query(PARAGRAPHS[0], top_k=5, topic="sandhi")
+
+    assert [c.topic for c, _ in results] == ["sandhi"] * len(results)
+    assert [c.sutra_number for c, _ in results] == ["6.1.87"]
+
+
+def test_top_k_indices_matches_full_sort():
+    """argpartition top-k returns the same winners as a full descending sort"""
+    scores = np.random.default_rng(2).standard_normal(1000).astype(np.float32)
+
+    assert rag_module.top_k_indices(scores, 7).tolist() == np.argsort(-scores)[:7].tolist()
+    assert rag_module.top_k_indices(scores[:3], 5).tolist() == np.argsort(-scores[:3]).tolist()
+    assert len(rag_module.top_k_indices(scores, 0)) == 0
+
+
+def test_rag_query_cache_skips_embedding(rag, fake_embedding, monkeypatch):
+    """Repeated queries (modulo whitespace) are served without embedding or search"""
+    searches = []
+    search = rag._search
+    monkeypatch.setattr(rag, "_search", lambda *args: searches.append(args) or search(*args))
+
+    first = rag.query("  What is   guṇa? ")
+    calls = len(fake_embedding.calls)
+    assert rag.query("What is guṇa?") == first
+    assert len(fake_embedding.calls) == calls
+    assert len(searches) == 1
+
+    rag.query("What is guṇa?", cache=False)
+    assert len(searches) == 2
+
+
+def test_build_index_embeds_duplicate_chunks_once(tmp_path, llm, fake_embedding):
+    """A paragraph repeated across files is embedded once and shared by both chunks"""
+    data_dir = tmp_path / "dupes"
+    data_dir.mkdir()
+    (data_dir / "ashtadhyayi.txt").write_text("\n\n".join(PARAGRAPHS), encoding="utf-8")
+    (data_dir / "kashika.txt").write_text(PARAGRAPHS[1], encoding="utf-8")
+    rag = GrammarRAG(data_dir=str(data_dir), llm_client=llm)
+    rag.load_texts()
+    rag.build_index()
+
+    sent = [text for call in fake_embedding.calls for text in call]
+    assert len(rag.chunks) == len(PARAGRAPHS) + 1
+    assert sorted(sent) == sorted(PARAGRAPHS)
+    dupes = [i for i, c in enumerate(rag.chunks) if c.text == PARAGRAPHS[1]]
+    assert np.array_equal(rag.chunk_embeddings[dupes[0]], rag.chunk_embeddings[dupes[1]])
+
+
+def test_format_context_labels_and_caches(rag):
+    """Context blocks are labeled by source and reused for the same chunks"""
+    chunks = rag.chunks[:2]
+    text = rag.format_context(chunks)
+
+    assert (
+        text
+        == "[ashtadhyayi 1.1.1]\n" + PARAGRAPHS[0] + "\n\n[ashtadhyayi 1.1.2]\n" + PARAGRAPHS[1]
+    )
+    assert rag.format_context(list(chunks)) is text
+    assert rag.format_context(chunks, labeled=False) == PARAGRAPHS[0] + "\n\n" + PARAGRAPHS[1]
+
+    # Caller-supplied chunks may share an id without sharing content
+    rule_a = rag_module.GrammarChunk(id="x", text="RULE A", source="custom")
+    rule_b = rag_module.GrammarChunk(id="x", text="RULE B", source="custom")
+    assert rag.format_context([rule_a], labeled=False) == "RULE A"
+    assert rag.format_context([rule_b], labeled=False) == "RULE B"
+
+
+def test_dot_scores_keeps_float32_for_float64_query():
+    """A float64 query does not promote the scan to float64"""
+    matrix = np.eye(4, dtype=np.float32)
+    scores = rag_module.dot_scores(matrix, np.arange(4, dtype=np.float64))
+
+    assert scores.dtype == np.float32
+    assert scores.tolist() == [0.0, 1.0, 2.0, 3.0]
+
+
+async def test_aquery_coalesces_concurrent_exact_scans(rag, monkeypatch):
+    """Concurrent aquery calls share one batched matmul, off the loop, and match query()"""
+    rag._ann_index = None
+    # A generous window so slow CI cannot split the batch
+    monkeypatch.setattr(rag_module, "_COALESCE_WINDOW_S", 0.5)
+    flushes = []
+    score_batch = rag._coalescer._score_batch
+
+    def spy(queries):
+        flushes.append((len(queries), threading.current_thread() is threading.main_thread()))
+        return score_batch(queries)
+
+    monkeypatch.setattr(rag._coalescer, "_score_batch", spy)
+
+    queries = [("guṇa", None), ("vṛddhi", "sanskrit"), ("sandhi", None)]
+    results = await asyncio.gather(
+        *(rag.aquery(text, top_k=2, language=lang, cache=False) for text, lang in queries)
+    )
+
+    assert flushes == [(3, False)]
+    for (text, lang), got in zip(queries, results):
+        expected = rag.query(text, top_k=2, language=lang, cache=False)
+        assert [(c.id, round(s, 5)) for c, s in got] == [(c.id, round(s, 5)) for c, s in expected]
+
+
+def test_unit_skips_already_normalized_queries():
+    """Unit and zero query vectors are not copied; others are scaled to unit length"""
+    q = np.array([0.6, 0.8], dtype=np.float32)
+    assert rag_module._unit(q) is q
+    zero = np.zeros(2, dtype=np.float32)
+    assert rag_module._unit(zero) is zero
+
+    scaled = rag_module._unit(np.array([3.0, 4.0]))
+    assert scaled.dtype == np.float32
+    assert np.allclose(scaled, [0.6, 0.8])